@@ -1,14 +1,21 @@
 import asyncio
+import io
 import logging
 import re
-import json
-from telegram import Update, BotCommand, InlineKeyboardButton, InlineKeyboardMarkup, Bot, User
+import shlex
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from operator import attrgetter, itemgetter
+from aiolimiter import AsyncLimiter
+from telegram import Update, BotCommand, InlineKeyboardButton, InlineKeyboardMarkup, Bot, User, InputFile
 from telegram.ext import (
     Application, ApplicationBuilder, CommandHandler, ContextTypes,
     MessageHandler, filters, CallbackQueryHandler
 )
 from telegram.constants import ParseMode
-from telegram.error import BadRequest, Forbidden, TimedOut
+from telegram.request import HTTPXRequest
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
 from telegram.helpers import escape_markdown
 import config
 import redis_db as database
@@ -27,44 +34,28 @@ logging.getLogger("apscheduler").setLevel(logging.WARNING)
 logging.getLogger("redis").setLevel(logging.INFO)
 logger = logging.getLogger(__name__)
 
-def is_admin(update: Update) -> bool:
-    """Checks if the user initiating the update is an admin"""
-    return update.effective_user and update.effective_user.id in config.ADMIN_CHAT_IDS
-
-
-async def set_bot_commands(application: Application):
-    """Sets the bot commands visible in Telegram"""
-    commands = [
-        BotCommand("start", "Start interacting with the bot"),
-        BotCommand("help", "Show help message"),
-        BotCommand("monitor", "Monitor price below X (e.g., /monitor mercari 'holo plush' 5000)"),
-        BotCommand("monitor_ending", "Monitor Yahoo Auctions ending soon (e.g., /monitor_ending 'holo figure' 5000 20)"),
-        BotCommand("list", "List your active monitoring tasks"),
-        BotCommand("stop", "Stop a specific monitoring task (use ID from /list)"),
-        BotCommand("support", "Send a message to the bot admin (e.g., /support My issue is...)"),
-        BotCommand("list_all", "[Admin] List all tasks from all users."),
-        BotCommand("announce_wipe", "[Admin] Announce DB wipe to users."),
-    ]
-    try:
-        await application.bot.set_my_commands(commands)
-        logger.info("Bot commands set successfully.")
-    except TimedOut:
-        logger.error("Timed out while setting bot commands. Check network connectivity.")
-    except Exception as e:
-        logger.error(f"Failed to set bot commands: {e}", exc_info=True)
+_CHECK_INTERVAL_MINUTES = int(config.DEFAULT_CHECK_INTERVAL_SECONDS // 60)
 
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Sends a welcome message"""
-    user = update.effective_user
-    await update.message.reply_html(
-        f"Hi {user.mention_html()}! I can monitor ZenMarket for you.\n"
-        "Use /help to see available commands."
-    )
+_MD_STRIP_TABLE = str.maketrans('', '', '*`\\_[]()~>#+-=|{}.!')
+_CAP_TEMPLATE = (
+    "✨ *New Item Found*\n\n"
+    "*Query:* `{safe_query}` \\({safe_platform}\\)\n"
+    "*Item:* {safe_item_name}\n"
+    "*Price:* `¥{item_price_val:,.0f}` \\(Task Max: `¥{task_max_price:,.0f}`\\){time_block}{link_block}"
+)
+_CAP_TEMPLATE_PLAIN = (
+    "✨ New Item Found!\n"
+    "Query: {query} ({platform})\n"
+    "Item: {item_name}\n"
+    "Price: ¥{item_price_val:,.0f} (Task Max: ¥{task_max_price:,.0f}){time_block}{link_block}"
+)
 
-async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Displays help information using MarkdownV2"""
+_task_fields = itemgetter('chat_id', 'max_price', 'max_minutes_left', 'platform', 'query')
+_item_fields = attrgetter('url', 'price', 'minutes_left', 'name', 'image_url')
+_ENTITY_ERR_RE = re.compile(r"entity|can't parse entities")
+_USER_CHAT_ID_RE = re.compile(r'<b>User Chat ID:</b>\s*<code>\s*(\d+)\s*</code>', re.IGNORECASE)
 
-    help_text = f"""
+_HELP_TEXT_USER = f"""
 *ZenMarket Monitoring Bot*
 
 Use these commands:
@@ -97,11 +88,10 @@ Use these commands:
 • `/help`
   Show this help message\.
 
-*Note:* The bot checks periodically \(approx\. every {int(config.DEFAULT_CHECK_INTERVAL_SECONDS / 60)} minutes\)\. Web scraping depends on ZenMarket's website structure\. Prices are checked in JPY\. Time remaining is approximate\.
+*Note:* The bot checks periodically \(approx\. every {_CHECK_INTERVAL_MINUTES} minutes\)\. Web scraping depends on ZenMarket's website structure\. Prices are checked in JPY\. Time remaining is approximate\.
 """
 
-    if is_admin(update):
-        admin_help = """
+_HELP_TEXT_ADMIN = _HELP_TEXT_USER + """
 
 *Admin Commands:*
 • `/list_all`
@@ -109,15 +99,97 @@ Use these commands:
 • `/announce_wipe`
   Notify all users about an upcoming database wipe \(Redis flush\)\.
 """
-        help_text += admin_help
+
+_HELP_PLAIN_USER = _HELP_TEXT_USER.translate(_MD_STRIP_TABLE)
+_HELP_PLAIN_ADMIN = _HELP_TEXT_ADMIN.translate(_MD_STRIP_TABLE)
+
+_ADMIN_IDS = frozenset(config.ADMIN_CHAT_IDS)
+
+# Telegram allows ~30 msgs/s overall and ~20 msgs/min into a single chat
+_GLOBAL_SEND_LIMITER = AsyncLimiter(28, 1.0)
+_chat_send_limiters = defaultdict(lambda: AsyncLimiter(19, 60))
+
+_LIST_ALL_TASK_TEMPLATE = "\n  • *ID:* `{id}`\n    *Platform:* {platform}\n    *Query:* `{query}`\n    *Max Price:* `¥{price:,.0f}`{cond}{sort}"
+
+@lru_cache(maxsize=4096)
+def _escape_md2(text):
+    """escape_markdown(version=2) memoized for the small, repeating set of platforms, queries and sort options"""
+    return escape_markdown(text, version=2)
+
+async def _reply_in_parts(message, parts, parse_mode=ParseMode.MARKDOWN_V2):
+    """Replies with each non-empty part in order, paced by the chat's shared send limiter"""
+    for part in parts:
+        if part.strip():
+            async with _chat_send_limiters[message.chat_id], _GLOBAL_SEND_LIMITER:
+                await message.reply_text(part, parse_mode=parse_mode)
+
+def _command_args(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Splits a command's arguments, keeping double-quoted queries together
+    Apostrophes and backslashes are left alone (product names use them); single-quoted queries are
+    unwrapped by _unquote_query. Falls back to context.args if a double quote is left unclosed
+    """
+    lexer = shlex.shlex(update.message.text, posix=True)
+    lexer.whitespace_split = True
+    lexer.commenters = ''
+    lexer.quotes = '"'
+    lexer.escape = ''
+    try:
+        return list(lexer)[1:]
+    except ValueError:
+        return list(context.args)
+
+def _unquote_query(query):
+    """Removes one pair of single quotes wrapping the whole query"""
+    if len(query) >= 2 and query.startswith("'") and query.endswith("'"):
+        return query[1:-1].strip()
+    return query
+
+def is_admin(update: Update) -> bool:
+    """Checks if the user initiating the update is an admin"""
+    return update.effective_user is not None and update.effective_user.id in _ADMIN_IDS
+
+
+async def set_bot_commands(application: Application):
+    """Sets the bot commands visible in Telegram"""
+    commands = [
+        BotCommand("start", "Start interacting with the bot"),
+        BotCommand("help", "Show help message"),
+        BotCommand("monitor", "Monitor price below X (e.g., /monitor mercari 'holo plush' 5000)"),
+        BotCommand("monitor_ending", "Monitor Yahoo Auctions ending soon (e.g., /monitor_ending 'holo figure' 5000 20)"),
+        BotCommand("list", "List your active monitoring tasks"),
+        BotCommand("stop", "Stop a specific monitoring task (use ID from /list)"),
+        BotCommand("support", "Send a message to the bot admin (e.g., /support My issue is...)"),
+        BotCommand("list_all", "[Admin] List all tasks from all users."),
+        BotCommand("announce_wipe", "[Admin] Announce DB wipe to users."),
+    ]
+    try:
+        await application.bot.set_my_commands(commands)
+        logger.info("Bot commands set successfully.")
+    except TimedOut:
+        logger.error("Timed out while setting bot commands. Check network connectivity.")
+    except Exception as e:
+        logger.error(f"Failed to set bot commands: {e}", exc_info=True)
+
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Sends a welcome message"""
+    user = update.effective_user
+    await update.message.reply_html(
+        f"Hi {user.mention_html()}! I can monitor ZenMarket for you.\n"
+        "Use /help to see available commands."
+    )
+
+async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Displays help information using MarkdownV2"""
+    admin = is_admin(update)
+    help_text = _HELP_TEXT_ADMIN if admin else _HELP_TEXT_USER
 
     try:
         await update.message.reply_text(help_text, parse_mode=ParseMode.MARKDOWN_V2)
     except BadRequest as e:
 
         logger.error(f"Failed to send help message with MarkdownV2 despite escaping: {e}. Sending plain text.")
-        plain_text = re.sub(r'[*`\\_\[\]\(\)~>
-        await update.message.reply_text(plain_text)
+        await update.message.reply_text(_HELP_PLAIN_ADMIN if admin else _HELP_PLAIN_USER)
     except Exception as e:
         logger.error(f"Unexpected error sending help message: {e}", exc_info=True)
         await update.message.reply_text("Sorry, I couldn't display the help message right now.")
@@ -126,26 +198,18 @@ Use these commands:
 async def monitor(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Adds a new standard monitoring task"""
     chat_id = update.effective_chat.id
-    args = context.args
     usage = "Usage: /monitor <platform> '<query>' <max_price>\nExample: /monitor mercari 'hololive plush' 5000"
     platform = ""
     query = ""
     max_price_str = ""
     try:
+        args = _command_args(update, context)
         if len(args) < 3: raise ValueError("Incorrect number of arguments.")
         platform = args[0].lower()
         if platform not in ['mercari', 'rakuten', 'yahoo']: raise ValueError("Invalid platform.")
         max_price_str = args[-1]
         if not max_price_str.strip().replace('.', '', 1).isdigit(): raise ValueError("Max price must be a number.")
-        raw_query_parts = args[1:-1]
-        if len(raw_query_parts) == 1 and raw_query_parts[0].startswith("'") and raw_query_parts[0].endswith("'"):
-            query = raw_query_parts[0][1:-1].strip()
-        elif raw_query_parts and raw_query_parts[0].startswith("'") and args[-2].endswith("'"):
-            query = " ".join(raw_query_parts)[1:-1].strip()
-        else:
-             query = " ".join(raw_query_parts).strip()
-             if query and ' ' in query and not (query.startswith("'") and query.endswith("'")):
-                 logger.warning(f"Parsing multi-word query '{query}' without quotes for /monitor.")
+        query = _unquote_query(" ".join(args[1:-1]).strip())
         if not query: raise ValueError("Query cannot be empty.")
         max_price = float(max_price_str.strip())
         if max_price <= 0: raise ValueError("Max price must be positive.")
@@ -164,34 +228,26 @@ async def monitor(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     task_id = database.add_task(chat_id, platform, query, max_price, sort_options, max_minutes_left=None)
 
     if task_id:
-        await update.message.reply_text(f"✅ Standard monitoring started for '{escape_markdown(query, version=2)}' on {platform.capitalize()} \(Max Price: ¥{max_price:,.0f}\)\. Task ID: `{task_id}`\nChecking every {int(config.DEFAULT_CHECK_INTERVAL_SECONDS / 60)} mins\.", parse_mode=ParseMode.MARKDOWN_V2)
+        await update.message.reply_text(f"✅ Standard monitoring started for '{escape_markdown(query, version=2)}' on {platform.capitalize()} \(Max Price: ¥{max_price:,.0f}\)\. Task ID: `{task_id}`\nChecking every {_CHECK_INTERVAL_MINUTES} mins\.", parse_mode=ParseMode.MARKDOWN_V2)
     else:
         await update.message.reply_text(f"⚠️ Could not add task due to a database error\. Please try again later or contact support if the issue persists\.", parse_mode=ParseMode.MARKDOWN_V2)
 
 async def monitor_ending(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Adds a task to monitor Yahoo auctions ending soon"""
     chat_id = update.effective_chat.id
-    args = context.args
     usage = "Usage: /monitor_ending '<query>' <max_price> <max_minutes>\nExample: /monitor_ending 'holo figure' 5000 20"
     platform = 'yahoo'
     query = ""
     max_price_str = ""
     max_minutes_str = ""
     try:
+        args = _command_args(update, context)
         if len(args) < 3: raise ValueError("Incorrect number of arguments.")
         max_price_str = args[-2]
         max_minutes_str = args[-1]
         if not max_price_str.strip().replace('.', '', 1).isdigit(): raise ValueError("Max price must be a number.")
         if not max_minutes_str.strip().isdigit(): raise ValueError("Max minutes must be an integer.")
-        raw_query_parts = args[0:-2]
-        if len(raw_query_parts) == 1 and raw_query_parts[0].startswith("'") and raw_query_parts[0].endswith("'"):
-             query = raw_query_parts[0][1:-1].strip()
-        elif raw_query_parts and raw_query_parts[0].startswith("'") and args[-3].endswith("'"):
-             query = " ".join(raw_query_parts)[1:-1].strip()
-        else:
-            query = " ".join(raw_query_parts).strip()
-            if query and ' ' in query and not (query.startswith("'") and query.endswith("'")):
-                 logger.warning(f"Parsing multi-word query '{query}' without quotes for /monitor_ending.")
+        query = _unquote_query(" ".join(args[0:-2]).strip())
         if not query: raise ValueError("Query cannot be empty.")
         max_price = float(max_price_str.strip())
         max_minutes = int(max_minutes_str.strip())
@@ -209,7 +265,7 @@ async def monitor_ending(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     task_id = database.add_task(chat_id, platform, query, max_price, sort_options, max_minutes_left=max_minutes)
 
     if task_id:
-        await update.message.reply_text(f"✅ Yahoo Auction monitoring started for '{escape_markdown(query, version=2)}' \(Max Price: ¥{max_price:,.0f}, Ending within: {max_minutes} min\)\. Task ID: `{task_id}`\nChecking every {int(config.DEFAULT_CHECK_INTERVAL_SECONDS / 60)} mins\.", parse_mode=ParseMode.MARKDOWN_V2)
+        await update.message.reply_text(f"✅ Yahoo Auction monitoring started for '{escape_markdown(query, version=2)}' \(Max Price: ¥{max_price:,.0f}, Ending within: {max_minutes} min\)\. Task ID: `{task_id}`\nChecking every {_CHECK_INTERVAL_MINUTES} mins\.", parse_mode=ParseMode.MARKDOWN_V2)
     else:
         await update.message.reply_text(f"⚠️ Could not add task due to a database error\. Please try again later or contact support if the issue persists\.", parse_mode=ParseMode.MARKDOWN_V2)
 
@@ -227,9 +283,9 @@ async def list_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
         task_id = task['id']; platform = task.get('platform', 'N/A'); query = task.get('query', 'N/A')
         max_price = task.get('max_price', 0.0); sort_options = task.get('sort_options')
         max_minutes_left = task.get('max_minutes_left')
-        safe_query = escape_markdown(query, version=2)
-        safe_platform = escape_markdown(platform.capitalize(), version=2)
-        safe_sort = escape_markdown(str(sort_options) or 'None', version=2) if sort_options else "Default"
+        safe_query = _escape_md2(query)
+        safe_platform = _escape_md2(platform.capitalize())
+        safe_sort = _escape_md2(str(sort_options) or 'None') if sort_options else "Default"
         sort_info = f" \(Sort: `{safe_sort}`\)" if sort_options else ""
         condition = f"\n  *Condition:* Ending ≤ {max_minutes_left} min" if max_minutes_left is not None else ""
         task_str = (f"\n• *ID:* `{task_id}`\n"
@@ -244,26 +300,26 @@ async def list_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
         if len(full_message) > max_length:
             logger.info(f"Long /list message for chat {chat_id} ({len(full_message)} chars). Splitting...")
             parts_to_send = []
-            current_part = "*Your active monitoring tasks:*\n"
+            current_chunks = ["*Your active monitoring tasks:*\n"]
+            current_len = len(current_chunks[0])
             footer = "\n\nUse `/stop <task_id>` to remove a task\."
             max_part_len = max_length - len(footer)
             for task_str in message_parts[1:-1]:
-                if len(current_part) + len(task_str) > (max_length if not parts_to_send else max_part_len):
-                    parts_to_send.append(current_part)
-                    current_part = task_str
+                if current_len + len(task_str) > (max_length if not parts_to_send else max_part_len):
+                    parts_to_send.append("".join(current_chunks))
+                    current_chunks = [task_str]
+                    current_len = len(task_str)
                 else:
-                    current_part += task_str
-            parts_to_send.append(current_part)
+                    current_chunks.append(task_str)
+                    current_len += len(task_str)
+            parts_to_send.append("".join(current_chunks))
             if parts_to_send: parts_to_send[-1] += footer
-            for i, part_message in enumerate(parts_to_send):
-                 if part_message.strip():
-                    await update.message.reply_text(part_message, parse_mode=ParseMode.MARKDOWN_V2)
-                    if i < len(parts_to_send) - 1: await asyncio.sleep(0.6)
+            await _reply_in_parts(update.message, parts_to_send)
         else:
             await update.message.reply_text(full_message, parse_mode=ParseMode.MARKDOWN_V2)
     except BadRequest as e:
         logger.error(f"Error sending /list message with MarkdownV2: {e}. Length: {len(full_message)}. Sending plain.")
-        plain_text_message = re.sub(r'[*`\\_\[\]\(\)~>
+        plain_text_message = full_message.translate(_MD_STRIP_TABLE)
         await update.message.reply_text(plain_text_message)
     except Exception as e:
         logger.error(f"Unexpected error sending /list message: {e}", exc_info=True)
@@ -296,94 +352,69 @@ async def list_all_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return
 
     logger.info(f"Admin {update.effective_user.id} requested /list_all")
-    all_task_ids = database.get_all_task_ids()
+    task_id_list = list(database.get_all_task_ids())
 
-    if not all_task_ids:
+    if not task_id_list:
         await update.message.reply_text("No active monitoring tasks found in the database for any user.")
         return
 
-    all_tasks_details = []
-    logger.info(f"Fetching details for {len(all_task_ids)} tasks...")
-    fetch_errors = 0
-    pipe = database.r.pipeline()
-    for task_id in all_task_ids:
-        pipe.hgetall(database.key_task(task_id))
-    try:
-        task_hashes = pipe.execute()
-    except Exception as pipe_err:
-         logger.error(f"Redis pipeline error fetching all task details: {pipe_err}", exc_info=True)
-         await update.message.reply_text("Error fetching task details from database.")
-         return
-
-    task_id_list = list(all_task_ids)
-    for i, task_hash in enumerate(task_hashes):
-        task_id = task_id_list[i]
-        parsed_task = database._parse_task_hash(task_hash)
-        if parsed_task:
-            all_tasks_details.append(parsed_task)
-        else:
-            logger.warning(f"Failed to parse task hash for task ID {task_id} during /list_all")
-            fetch_errors += 1
+    logger.info(f"Fetching details for {len(task_id_list)} tasks...")
+    all_tasks_details = list(database.get_tasks_by_ids(task_id_list).values())
+    fetch_errors = len(task_id_list) - len(all_tasks_details)
 
     if not all_tasks_details:
          await update.message.reply_text("Found task IDs but failed to fetch details.")
          return
 
-    tasks_by_chat = {}
+    tasks_by_chat = defaultdict(list)
     for task in all_tasks_details:
         chat_id = task.get('chat_id')
         if chat_id:
-            if chat_id not in tasks_by_chat: tasks_by_chat[chat_id] = []
             tasks_by_chat[chat_id].append(task)
 
-    message_parts = ["*All Active Monitoring Tasks \(Grouped by User\):*\n"]
     total_task_count = len(all_tasks_details)
+    buf = io.StringIO()
+    buf.write("*All Active Monitoring Tasks \(Grouped by User\):*\n")
+    buf.write(f"\n*Total Tasks:* {total_task_count} (Details fetch errors: {fetch_errors})\n")
     sorted_chat_ids = sorted(tasks_by_chat.keys())
+    chat_results = await asyncio.gather(*(context.bot.get_chat(cid) for cid in sorted_chat_ids), return_exceptions=True)
+    chat_info_map = dict(zip(sorted_chat_ids, chat_results))
 
     for chat_id in sorted_chat_ids:
         tasks = tasks_by_chat[chat_id]
         user_info_parts = [f"User Chat ID: `{chat_id}` \({len(tasks)} tasks\)"]
-        try:
-            chat = await context.bot.get_chat(chat_id)
-            if chat.username: user_info_parts.append(f"@{escape_markdown(chat.username, version=2)}")
-            elif chat.full_name: user_info_parts.append(f"\({escape_markdown(chat.full_name, version=2)}\)")
-        except Forbidden: user_info_parts.append("\(Info Unavailable / Blocked\)")
-        except Exception as e: logger.warning(f"Could not fetch chat details for {chat_id} during /list_all: {type(e).__name__}")
+        chat = chat_info_map[chat_id]
+        if isinstance(chat, Forbidden): user_info_parts.append("\(Info Unavailable / Blocked\)")
+        elif isinstance(chat, Exception): logger.warning(f"Could not fetch chat details for {chat_id} during /list_all: {type(chat).__name__}")
+        elif chat.username: user_info_parts.append(f"@{escape_markdown(chat.username, version=2)}")
+        elif chat.full_name: user_info_parts.append(f"\({escape_markdown(chat.full_name, version=2)}\)")
 
         user_info = ' '.join(user_info_parts)
-        message_parts.append(f"\n\n---\n*Chat:* {user_info}\n---")
+        buf.write(f"\n\n---\n*Chat:* {user_info}\n---")
 
         for task in tasks:
-            task_id = task['id']; platform = task.get('platform', 'N/A'); query = task.get('query', 'N/A')
-            max_price = task.get('max_price', 0.0); sort_options = task.get('sort_options')
+            sort_options = task.get('sort_options')
             max_minutes_left = task.get('max_minutes_left')
-            safe_query = escape_markdown(query, version=2)
-            safe_platform = escape_markdown(platform.capitalize(), version=2)
-            safe_sort = escape_markdown(str(sort_options) or 'None', version=2) if sort_options else "Default"
-            sort_info = f" \(Sort: `{safe_sort}`\)" if sort_options else ""
-            condition = f"\n    *Condition:* Ending ≤ {max_minutes_left} min" if max_minutes_left is not None else ""
-            task_str = (f"\n  • *ID:* `{task_id}`\n"
-                        f"    *Platform:* {safe_platform}\n"
-                        f"    *Query:* `{safe_query}`\n"
-                        f"    *Max Price:* `¥{max_price:,.0f}`{condition}{sort_info}")
-            message_parts.append(task_str)
-
-    message_parts.insert(1, f"\n*Total Tasks:* {total_task_count} (Details fetch errors: {fetch_errors})\n")
-    full_message = "".join(message_parts)
+            buf.write(_LIST_ALL_TASK_TEMPLATE.format(
+                id=task['id'],
+                platform=_escape_md2(task.get('platform', 'N/A').capitalize()),
+                query=_escape_md2(task.get('query', 'N/A')),
+                price=task.get('max_price', 0.0),
+                cond=f"\n    *Condition:* Ending ≤ {max_minutes_left} min" if max_minutes_left is not None else "",
+                sort=f" \\(Sort: `{_escape_md2(str(sort_options))}`\\)" if sort_options else ""))
+
+    full_message = buf.getvalue()
     max_length = 4096
     try:
         if len(full_message) > max_length:
             logger.info(f"/list_all message is long ({len(full_message)} chars). Sending in parts.")
             parts_to_send = [full_message[i:i + max_length] for i in range(0, len(full_message), max_length)]
-            for i, part_message in enumerate(parts_to_send):
-                if part_message.strip():
-                    await update.message.reply_text(part_message, parse_mode=ParseMode.MARKDOWN_V2)
-                    if i < len(parts_to_send) - 1: await asyncio.sleep(0.8)
+            await _reply_in_parts(update.message, parts_to_send)
         else:
             await update.message.reply_text(full_message, parse_mode=ParseMode.MARKDOWN_V2)
     except BadRequest as e:
         logger.error(f"Error sending /list_all message with MarkdownV2: {e}. Length: {len(full_message)}. Sending plain.")
-        plain_text_message = re.sub(r'[*`\\_\[\]\(\)~>
+        plain_text_message = full_message.translate(_MD_STRIP_TABLE)
         await update.message.reply_text(plain_text_message)
     except Exception as e:
         logger.error(f"Unexpected error sending /list_all message: {e}", exc_info=True)
@@ -407,13 +438,13 @@ async def support_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         f"<b>Message:</b>\n<pre>{escape_markdown(user_message, entity_type='pre')}</pre>"
     )
     message_sent_to_admin = False; failed_admin_ids = []; sent_admin_ids = []
-    for admin_id in config.ADMIN_CHAT_IDS:
-        try:
-            await context.bot.send_message(chat_id=admin_id, text=admin_message_text, parse_mode=ParseMode.HTML)
-            message_sent_to_admin = True; sent_admin_ids.append(admin_id)
-        except Forbidden: logger.warning(f"Failed to send support msg to admin {admin_id}: Blocked."); failed_admin_ids.append(admin_id)
-        except Exception as e: logger.error(f"Failed to send support msg to admin {admin_id}: {e}"); failed_admin_ids.append(admin_id)
-        await asyncio.sleep(0.2)
+    send_results = await asyncio.gather(
+        *(context.bot.send_message(chat_id=admin_id, text=admin_message_text, parse_mode=ParseMode.HTML) for admin_id in config.ADMIN_CHAT_IDS),
+        return_exceptions=True)
+    for admin_id, result in zip(config.ADMIN_CHAT_IDS, send_results):
+        if isinstance(result, Forbidden): logger.warning(f"Failed to send support msg to admin {admin_id}: Blocked."); failed_admin_ids.append(admin_id)
+        elif isinstance(result, Exception): logger.error(f"Failed to send support msg to admin {admin_id}: {result}"); failed_admin_ids.append(admin_id)
+        else: message_sent_to_admin = True; sent_admin_ids.append(admin_id)
     if message_sent_to_admin:
         await update.message.reply_text("✅ Your message has been sent to the administrator\. They will reply here if needed\.", parse_mode=ParseMode.MARKDOWN_V2)
         logger.info(f"Support message from {user.id} forwarded to admins: {sent_admin_ids}")
@@ -426,7 +457,7 @@ async def handle_admin_support_reply(update: Update, context: ContextTypes.DEFAU
     replied_message = update.message.reply_to_message
     if not replied_message.from_user.is_bot: return
     original_message_html = replied_message.text_html
-    user_chat_id_match = re.search(r'<b>User Chat ID:</b>\s*<code>\s*(\d+)\s*</code>', original_message_html, re.IGNORECASE)
+    user_chat_id_match = _USER_CHAT_ID_RE.search(original_message_html)
     if not user_chat_id_match:
         logger.warning(f"Admin {admin_user.id} replied, but couldn't extract original user chat ID. Regex failed. HTML: '{original_message_html}'")
         await update.message.reply_text("⚠️ Couldn't identify user chat ID\. Reply not sent\.", parse_mode=ParseMode.MARKDOWN_V2); return
@@ -452,66 +483,195 @@ async def handle_admin_support_reply(update: Update, context: ContextTypes.DEFAU
          else: logger.error(f"BadRequest admin reply {original_user_chat_id}: {e}"); await context.bot.send_message(chat_id=update.effective_chat.id, text=f"❌ Failed send reply due to Telegram error `{original_user_chat_id}`\.", reply_to_message_id=update.message.message_id, parse_mode=ParseMode.MARKDOWN_V2)
     except Exception as e: logger.error(f"Unexpected error admin reply {original_user_chat_id}: {e}"); await context.bot.send_message(chat_id=update.effective_chat.id, text=f"❌ Unexpected error sending reply `{original_user_chat_id}`\.", reply_to_message_id=update.message.message_id, parse_mode=ParseMode.MARKDOWN_V2)
 
-async def check_monitoring_tasks(context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Periodic job to check all active monitoring tasks using Redis"""
-    logger.info("Running periodic check for monitoring tasks (Redis)...")
-    bot: Bot = context.bot
+async def _send_rate_limited(send, chat_id, **kwargs):
+    """Calls a Bot send method within the per-chat and global rate limits, retrying once after RetryAfter"""
+    for attempt in range(2):
+        async with _chat_send_limiters[chat_id], _GLOBAL_SEND_LIMITER:
+            try:
+                return await send(chat_id=chat_id, **kwargs)
+            except RetryAfter as e:
+                if attempt:
+                    raise
+                retry_after = e.retry_after
+        logger.warning(f"Flood control hit for chat {chat_id}. Retrying in {retry_after}s.")
+        await asyncio.sleep(retry_after)
+
+async def _send_one(bot: Bot, task_id_str, task, item, caption_ctx, send_photos):
+    """
+    Sends a notification for one new item. caption_ctx (task fields for the caption templates)
+    and send_photos are shared by every item of the task (see _notify_task)
+    Returns (ok, item_link, remove_flag); remove_flag is set when the chat blocked the bot
+    """
+    chat_id, _, task_max_minutes, _, _ = _task_fields(task)
+    item_link, item_price_val, item_mins, item_name, image_url = _item_fields(item)
+
+    time_block = time_block_plain = ""
+    if task_max_minutes is not None:
+        if item_mins is not None and item_mins != -1:
+            time_block = f"\n*Ending In:* `≈ {item_mins} min` {caption_ctx['time_req']}"
+            time_block_plain = f"\nEnding In: ~{item_mins} min {caption_ctx['time_req_plain']}"
+        elif item_mins == -1:
+            time_block = f"\n*Ending In:* `Ended` {caption_ctx['time_req']}"
+            time_block_plain = f"\nEnding In: Ended {caption_ctx['time_req_plain']}"
+        else:
+            time_block = f"\n*Ending In:* `?` {caption_ctx['time_req']}"
+            time_block_plain = f"\nEnding In: ? {caption_ctx['time_req_plain']}"
+
+    caption = _CAP_TEMPLATE.format_map({
+        **caption_ctx,
+        'safe_item_name': escape_markdown(item_name or 'N/A', version=2),
+        'item_price_val': item_price_val,
+        'time_block': time_block,
+        'link_block': f"\n\n*Link:* [View Item]({item_link})" if item_link else "\n\n*Link:* `Not available`",
+    })
+    send_photo_attempted = False
+
+    async def send_text_fallback(e):
+        # the upload itself was rejected (not an image Telegram accepts, too large, ...),
+        # so send the same caption as text to still record the item as notified
+        logger.warning(f"Failed PHOTO (Task {task_id_str}, Item: {item_link}, Img: {image_url}), attempting TEXT fallback: {e}")
+        try:
+            await _send_rate_limited(
+                bot.send_message, chat_id,
+                text=caption,
+                parse_mode=ParseMode.MARKDOWN_V2,
+                disable_web_page_preview=False
+            )
+            return True, item_link, False
+        except Exception as fallback_text_err:
+            logger.error(f"Fallback TEXT failed after photo error (Task {task_id_str}, Item: {item_link}): {fallback_text_err}")
+            return False, item_link, False
 
-    task_ids = database.get_all_task_ids()
-    if not task_ids:
-        logger.info("No active tasks found in Redis to check.")
-        return
+    try:
+        # downloaded here over the scraper's pooled client instead of Telegram fetching the URL;
+        # an image that can't be fetched goes straight to the text message
+        photo_bytes = None
+        if send_photos and image_url and image_url.startswith('http'):
+            photo_bytes = await scraper.fetch_image(image_url)
+
+        if photo_bytes:
+            send_photo_attempted = True
+            await _send_rate_limited(
+                bot.send_photo, chat_id,
+                photo=InputFile(io.BytesIO(photo_bytes), filename='photo.jpg'),
+                caption=caption,
+                parse_mode=ParseMode.MARKDOWN_V2
+            )
+        else:
+
+            await _send_rate_limited(
+                bot.send_message, chat_id,
+                text=caption,
+                parse_mode=ParseMode.MARKDOWN_V2,
+                disable_web_page_preview=False
+            )
+        return True, item_link, False
+    except BadRequest as e:
+        error_str = str(e).lower()
+        is_entity_error = _ENTITY_ERR_RE.search(error_str) is not None
+
+        if send_photo_attempted and not is_entity_error:
+            return await send_text_fallback(e)
+
+        elif is_entity_error:
+            logger.error(f"MarkdownV2 BadRequest sending notification (Task {task_id_str}, Item: {item_link}): {e}. Caption: '{caption[:100]}...' Trying plain text fallback.")
+
+            plain_caption = _CAP_TEMPLATE_PLAIN.format_map({
+                **caption_ctx,
+                'item_name': item_name,
+                'item_price_val': item_price_val,
+                'time_block': time_block_plain,
+                'link_block': f"\n\nLink: {item_link}" if item_link else "",
+            })
+            try:
+                await _send_rate_limited(
+                    bot.send_message, chat_id,
+                    text=plain_caption,
+                    disable_web_page_preview=False
+                )
+                return True, item_link, False
+            except Exception as plain_fallback_e:
+                logger.error(f"Plain text fallback failed (Task {task_id_str}, Item: {item_link}): {plain_fallback_e}")
+                return False, item_link, False
+        else:
+            error_context = "photo" if send_photo_attempted else "text"
+            logger.error(f"Unhandled BadRequest sending ({error_context}) (Task {task_id_str}, Item: {item_link}): {e}", exc_info=True)
+            return False, item_link, False
 
-    logger.info(f"Found {len(task_ids)} active task IDs in Redis.")
+    except Forbidden as e:
+        logger.error(f"Forbidden error sending to {chat_id} (Task {task_id_str}): {e}. Schedule removal.")
+        return False, item_link, True
 
-    task_details_map = {}
-    notified_items_map = {}
-    fetch_errors = 0
-    pipe = database.r.pipeline(transaction=False)
-    for task_id in task_ids:
-        pipe.hgetall(database.key_task(task_id))
-        pipe.smembers(database.key_notified(task_id))
+    except TimedOut as e:
+        logger.error(f"Timeout error sending notification (Task {task_id_str}, Item: {item_link}): {e}")
+        return False, item_link, False
+
+    except NetworkError as e:
+        # e.g. HTTP 413 for an upload Telegram considers too large
+        if send_photo_attempted:
+            return await send_text_fallback(e)
+        logger.error(f"Network error sending notification (Task {task_id_str}, Item: {item_link}): {e}")
+        return False, item_link, False
 
-    try:
-        results = pipe.execute()
-    except redis.RedisError as e:
-        logger.error(f"Redis pipeline error fetching task data: {e}", exc_info=True)
-        return
     except Exception as e:
-        logger.error(f"Unexpected error during Redis pipeline execution: {e}", exc_info=True)
-        return
+        logger.error(f"Unexpected error sending notification (Task {task_id_str}, Item: {item_link}): {e}", exc_info=True)
+        return False, item_link, False
+
+async def _notify_task(bot: Bot, task_id_str, task, items):
+    """
+    Sends notifications for all new items of one task concurrently (pacing is left to the rate limiters)
+    Returns (newly_notified_urls, forbidden)
+    """
+    chat_id, task_max_price, task_max_minutes, platform, query = _task_fields(task)
+    logger.info(f"Found {len(items)} NEW items matching task {task_id_str} criteria (Chat: {chat_id})")
+    caption_ctx = {
+        'safe_query': _escape_md2(query or 'N/A'),
+        'safe_platform': _escape_md2(platform.capitalize()),
+        'query': query,
+        'platform': platform.capitalize(),
+        'task_max_price': task_max_price,
+        'time_req': f"\\(Task Req: `≤ {task_max_minutes} min`\\)",
+        'time_req_plain': f"(Task Req: <= {task_max_minutes} min)",
+    }
+    send_photos = platform != 'yahoo'
+    outcomes = await asyncio.gather(
+        *(_send_one(bot, task_id_str, task, item, caption_ctx, send_photos) for item in items))
+    newly_notified_urls = []
+    forbidden = False
+    for ok, item_link, remove_flag in outcomes:
+        if ok:
+            newly_notified_urls.append(item_link)
+        else:
+            logger.warning(f"Notify FAILED/SKIPPED Task {task_id_str}, Item: {item_link}. Not adding to notified set.")
+            forbidden = forbidden or remove_flag
+    return newly_notified_urls, forbidden
 
-    if len(results) != len(task_ids) * 2:
-        logger.error(f"CRITICAL: Mismatch in Redis pipeline results length! Expected {len(task_ids)*2}, got {len(results)}. Aborting cycle.")
+async def check_monitoring_tasks(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Periodic job to check all active monitoring tasks using Redis"""
+    logger.info("Running periodic check for monitoring tasks (Redis)...")
+    bot: Bot = context.bot
+
+    task_id_list = list(database.get_all_task_ids())
+    if not task_id_list:
+        logger.info("No active tasks found in Redis to check.")
         return
 
-    task_id_list = list(task_ids)
-    for i in range(len(task_id_list)):
-        task_id = task_id_list[i]
-        task_hash = results[i * 2]
-        notified_set = results[i * 2 + 1]
-        parsed_task = database._parse_task_hash(task_hash)
-        if parsed_task:
-            task_details_map[task_id] = parsed_task
-            notified_items_map[task_id] = notified_set if notified_set else set()
-        else:
-            logger.warning(f"Failed to parse task hash for task {task_id} during check cycle. Skipping task.")
-            fetch_errors += 1
+    logger.info(f"Found {len(task_id_list)} active task IDs in Redis.")
 
+    task_details_map = database.get_tasks_by_ids(task_id_list)
+    fetch_errors = len(task_id_list) - len(task_details_map)
     if not task_details_map:
         logger.info("No valid task details could be fetched. Ending check cycle.")
         return
 
     logger.info(f"Successfully fetched data for {len(task_details_map)} tasks ({fetch_errors} errors).")
 
-    tasks_to_scrape = {}
+    tasks_to_scrape = defaultdict(list)
     for task_id, task_data in task_details_map.items():
-        normalized_sort = task_data.get('sort_options')
-        scrape_key = (task_data.get('platform'), task_data.get('query'), normalized_sort)
+        scrape_key = task_data['_scrape_key']
         if not all(scrape_key[:2]):
              logger.warning(f"Skipping task {task_id} due to invalid scrape key components: {scrape_key}")
              continue
-        if scrape_key not in tasks_to_scrape: tasks_to_scrape[scrape_key] = []
         tasks_to_scrape[scrape_key].append(task_id)
 
     if not tasks_to_scrape:
@@ -520,15 +680,9 @@ async def check_monitoring_tasks(context: ContextTypes.DEFAULT_TYPE) -> None:
     logger.info(f"Need to perform {len(tasks_to_scrape)} unique scrapes for {len(task_details_map)} tasks.")
 
     keys_in_order = list(tasks_to_scrape.keys())
-    coroutines_to_run = []
-    for scrape_key in keys_in_order:
-        platform, query, sort_options = scrape_key
-        coroutines_to_run.append(asyncio.to_thread(scraper.scrape_zenmarket, platform, query, sort_options))
-
     scrape_results_raw = []
     try:
-        scrape_results_raw = await asyncio.wait_for(
-             asyncio.gather(*coroutines_to_run, return_exceptions=True), timeout=240.0)
+        scrape_results_raw = await asyncio.wait_for(scraper.scrape_many(keys_in_order), timeout=240.0)
     except asyncio.TimeoutError:
          logger.error("Scraping gather operation timed out. Skipping processing this cycle.")
          return
@@ -540,217 +694,147 @@ async def check_monitoring_tasks(context: ContextTypes.DEFAULT_TYPE) -> None:
     if len(keys_in_order) != len(scrape_results_raw):
         logger.error(f"CRITICAL: Mismatch scrape keys ({len(keys_in_order)}) and results ({len(scrape_results_raw)})! Aborting.")
         return
-    for i, result_or_exc in enumerate(scrape_results_raw):
-        scrape_key = keys_in_order[i]
-        scraped_items_map[scrape_key] = result_or_exc
-        if isinstance(result_or_exc, Exception): logger.warning(f"Scrape failed for group {scrape_key}: {result_or_exc}")
-        elif result_or_exc is None: logger.error(f"CRITICAL: Scraper returned None for group {scrape_key}. Treating as []."); scraped_items_map[scrape_key] = []
-
-    active_chat_ids_notified = set()
-    tasks_to_remove_later = []
-
-    for task_id_str, task in task_details_map.items():
-        chat_id = task.get('chat_id')
-        task_max_price = task.get('max_price')
-        task_max_minutes = task.get('max_minutes_left')
-        platform = task.get('platform')
-        query = task.get('query')
-        sort_options = task.get('sort_options')
-        notified_items_set = notified_items_map.get(task_id_str, set())
-
-        if not all([chat_id, platform, query, task_max_price is not None]):
-             logger.error(f"Skipping task {task_id_str}: missing essential data in map.")
-             continue
+    for scrape_key, result_or_exc in zip(keys_in_order, scrape_results_raw):
+        if type(result_or_exc) is list:
+            scraped_items_map[scrape_key] = result_or_exc
+        elif result_or_exc is None:
+            logger.error(f"CRITICAL: Scraper returned None for group {scrape_key}. Treating as []."); scraped_items_map[scrape_key] = []
+        else:
+            logger.warning(f"Scrape failed for group {scrape_key}: {result_or_exc}")
+
+    # one pass over each scrape result serves every task sharing its scrape key
+    matched_items_map = defaultdict(list)
+    for scrape_key, group_task_ids in tasks_to_scrape.items():
+        group_tasks = []
+        for task_id_str in group_task_ids:
+            chat_id, task_max_price, task_max_minutes, _, _ = _task_fields(task_details_map[task_id_str])
+            if not chat_id or task_max_price is None:
+                 logger.error(f"Skipping task {task_id_str}: missing essential data in map.")
+                 continue
+            group_tasks.append((task_id_str, task_max_price, task_max_minutes))
 
-        normalized_sort = sort_options
-        scrape_key = (platform, query, normalized_sort)
         scraped_result = scraped_items_map.get(scrape_key)
-
-        if isinstance(scraped_result, Exception) or scraped_result is None or not scraped_result:
+        if not group_tasks or not scraped_result:
             continue
-        items_to_notify_this_task = []
-        urls_found_matching_this_task = []
+        # highest price cap first: an item over a task's cap is over every cap after it
+        group_tasks.sort(key=itemgetter(1), reverse=True)
+        group_max_price = group_tasks[0][1]
 
         for item in scraped_result:
-            item_url = item.get('url'); item_price = item.get('price')
-            item_minutes_left = item.get('minutes_left')
-            if not item_url or item_price is None: continue
-
-            match = False
-            price_match = item_price <= task_max_price
-            time_match = False
-            if task_max_minutes is not None:
-                if item_minutes_left is not None and item_minutes_left != -1:
-                    time_match = item_minutes_left <= task_max_minutes
-                match = price_match and time_match
-            else:
-                match = price_match
+            item_url, item_price, item_minutes_left, _, _ = _item_fields(item)
+            if not item_url or item_price is None or item_price > group_max_price: continue
+            has_time = item_minutes_left is not None and item_minutes_left != -1
 
-            if match:
-                 urls_found_matching_this_task.append(item_url)
-                 if item_url not in notified_items_set:
-                     items_to_notify_this_task.append(item)
+            for task_id_str, task_max_price, task_max_minutes in group_tasks:
+                if item_price > task_max_price:
+                    break
+                if task_max_minutes is not None and not (has_time and item_minutes_left <= task_max_minutes):
+                    continue
+                matched_items_map[task_id_str].append(item)
+
+    already_notified = database.get_already_notified(
+        {task_id_str: [item.url for item in items] for task_id_str, items in matched_items_map.items()})
+    if already_notified is None:
+        logger.error("Could not check notified items in Redis. Ending check cycle.")
+        return
+
+    active_chat_ids_notified = set()
+    tasks_to_remove_later = set()
 
-        newly_notified_urls_for_db = []
+    tasks_to_notify = []
+    for task_id_str, matched_items in matched_items_map.items():
+        notified_items_set = already_notified.get(task_id_str, set())
+        items_to_notify_this_task = [item for item in matched_items if item.url not in notified_items_set]
         if items_to_notify_this_task:
-            logger.info(f"Found {len(items_to_notify_this_task)} NEW items matching task {task_id_str} criteria (Chat: {chat_id})")
-            for item in items_to_notify_this_task:
-                item_name = item.get('name', 'N/A')
-                item_price_val = item.get('price')
-                item_link = item.get('url')
-                image_url = item.get('image_url')
-                item_mins = item.get('minutes_left')
-
-                safe_query = escape_markdown(query or 'N/A', version=2)
-                safe_item_name = escape_markdown(item_name or 'N/A', version=2)
-
-                caption_lines = [
-                    f"✨ *New Item Found*\n",
-                    f"*Query:* `{safe_query}` \({escape_markdown(platform.capitalize(), version=2)}\)",
-                    f"*Item:* {safe_item_name}",
-                    f"*Price:* `¥{item_price_val:,.0f}` \(Task Max: `¥{task_max_price:,.0f}`\)"
-                ]
-
-                if task_max_minutes is not None:
-                    time_info = "*Ending In:* `?`"
-                    time_req = f"\(Task Req: `≤ {task_max_minutes} min`\)"
-                    if item_mins is not None and item_mins != -1:
-                        time_info = f"*Ending In:* `≈ {item_mins} min`"
-                    elif item_mins == -1:
-                        time_info = f"*Ending In:* `Ended`"
-                    caption_lines.append(f"{time_info} {time_req}")
-
-                if item_link:
-                    caption_lines.append(f"\n*Link:* [View Item]({item_link})")
-                else:
-                    caption_lines.append("\n*Link:* `Not available`")
-
-                caption = "\n".join(caption_lines)
-                message_sent_successfully = False
-                send_photo_attempted = False
-                try:
-
-                    if platform != 'yahoo' and image_url and image_url.startswith('http'):
-                        send_photo_attempted = True
-                        await bot.send_photo(
-                            chat_id=chat_id,
-                            photo=image_url,
-                            caption=caption,
-                            parse_mode=ParseMode.MARKDOWN_V2
-                        )
-                        message_sent_successfully = True
-                    else:
-
-                        await bot.send_message(
-                            chat_id=chat_id,
-                            text=caption,
-                            parse_mode=ParseMode.MARKDOWN_V2,
-                            disable_web_page_preview=False
-                        )
-                        message_sent_successfully = True
-                except BadRequest as e:
-                    error_str = str(e).lower()
-                    photo_error_indicators = [
-                        "failed to get http url content",
-                        "wrong file identifier",
-                        "photo_invalid",
-                        "wrong type of the web page content"
-                    ]
-                    is_common_photo_error = any(indicator in error_str for indicator in photo_error_indicators)
-
-                    if send_photo_attempted and is_common_photo_error:
-                        logger.warning(f"Failed PHOTO (Task {task_id_str}, Item: {item_link}, Img: {image_url}), attempting TEXT fallback: {e}")
-                        try:
-                            await bot.send_message(
-                                chat_id=chat_id,
-                                text=caption,
-                                parse_mode=ParseMode.MARKDOWN_V2,
-                                disable_web_page_preview=False
-                            )
-                            message_sent_successfully = True
-                        except Exception as fallback_text_err:
-                            logger.error(f"Fallback TEXT failed after photo error (Task {task_id_str}, Item: {item_link}): {fallback_text_err}")
-                            message_sent_successfully = False
-
-                    elif "entity" in error_str or "can't parse entities" in error_str:
-                        logger.error(f"MarkdownV2 BadRequest sending notification (Task {task_id_str}, Item: {item_link}): {e}. Caption: '{caption[:100]}...' Trying plain text fallback.")
-
-                        plain_caption_lines = [
-                            f"✨ New Item Found!",
-                            f"Query: {query} ({platform.capitalize()})",
-                            f"Item: {item_name}",
-                            f"Price: ¥{item_price_val:,.0f} (Task Max: ¥{task_max_price:,.0f})"
-                        ]
-                        if task_max_minutes is not None:
-                            time_info_plain = "Ending In: ?"
-                            if item_mins is not None and item_mins != -1:
-                                time_info_plain = f"Ending In: ~{item_mins} min"
-                            elif item_mins == -1:
-                                time_info_plain = f"Ending In: Ended"
-                            plain_caption_lines.append(f"{time_info_plain} (Task Req: <= {task_max_minutes} min)")
-                        if item_link:
-                             plain_caption_lines.append(f"\nLink: {item_link}")
-
-                        plain_caption = "\n".join(plain_caption_lines)
-                        try:
-                            await bot.send_message(
-                                chat_id=chat_id,
-                                text=plain_caption,
-                                disable_web_page_preview=False
-                            )
-                            message_sent_successfully = True
-                        except Exception as plain_fallback_e:
-                            logger.error(f"Plain text fallback failed (Task {task_id_str}, Item: {item_link}): {plain_fallback_e}")
-                            message_sent_successfully = False
-                    else:
-                        error_context = "photo" if send_photo_attempted else "text"
-                        logger.error(f"Unhandled BadRequest sending ({error_context}) (Task {task_id_str}, Item: {item_link}): {e}", exc_info=True)
-                        message_sent_successfully = False
-
-                except Forbidden as e:
-                    logger.error(f"Forbidden error sending to {chat_id} (Task {task_id_str}): {e}. Schedule removal.")
-                    if (task_id_str, chat_id) not in tasks_to_remove_later:
-                        tasks_to_remove_later.append((task_id_str, chat_id))
-                    active_chat_ids_notified.discard(chat_id)
-                    message_sent_successfully = False
-                    break
+            tasks_to_notify.append((task_id_str, items_to_notify_this_task))
 
-                except TimedOut as e:
-                    logger.error(f"Timeout error sending notification (Task {task_id_str}, Item: {item_link}): {e}")
-                    message_sent_successfully = False
-
-                except Exception as e:
-                    logger.error(f"Unexpected error sending notification (Task {task_id_str}, Item: {item_link}): {e}", exc_info=True)
-                    message_sent_successfully = False
-                if message_sent_successfully:
-                    newly_notified_urls_for_db.append(item_link)
-                    active_chat_ids_notified.add(chat_id)
-                    await asyncio.sleep(1.2)
-                else:
-                     logger.warning(f"Notify FAILED/SKIPPED Task {task_id_str}, Item: {item_link}. Not adding to notified set.")
+    notify_results = await asyncio.gather(
+        *(_notify_task(bot, task_id_str, task_details_map[task_id_str], items) for task_id_str, items in tasks_to_notify))
 
-        if (task_id_str, chat_id) not in tasks_to_remove_later and newly_notified_urls_for_db:
-            logger.info(f"Task {task_id_str}: Adding {len(newly_notified_urls_for_db)} newly notified URLs to Redis set.")
-            try:
-                added_count = database.add_notified_items(task_id_str, newly_notified_urls_for_db)
-                if added_count > 0:
-                    logger.info(f"Task {task_id_str}: Successfully added {added_count} new URLs to Redis notified set.")
-                elif added_count == 0 and newly_notified_urls_for_db:
-                    logger.warning(f"Task {task_id_str}: add_notified_items reported 0 added, but list was not empty. Maybe Redis error or all duplicates?")
-            except Exception as e:
-                 logger.error(f"Error updating notified items in Redis for task {task_id_str}: {e}", exc_info=True)
+    pending_adds = []
+    for (task_id_str, _), (newly_notified_urls_for_db, forbidden) in zip(tasks_to_notify, notify_results):
+        chat_id = task_details_map[task_id_str].get('chat_id')
+        if forbidden:
+            tasks_to_remove_later.add((task_id_str, chat_id))
+            continue
+        if newly_notified_urls_for_db:
+            active_chat_ids_notified.add(chat_id)
+            pending_adds.append((task_id_str, newly_notified_urls_for_db))
+
+    if pending_adds:
+        logger.info(f"Adding newly notified URLs to Redis for {len(pending_adds)} tasks.")
+        added_counts = database.add_notified_items_bulk(pending_adds)
+        for task_id_str, newly_notified_urls_for_db in pending_adds:
+            added_count = added_counts.get(task_id_str)
+            if added_count is None:
+                logger.error(f"Task {task_id_str}: Failed to add {len(newly_notified_urls_for_db)} notified URLs to Redis.")
+            elif added_count == 0:
+                logger.warning(f"Task {task_id_str}: add_notified_items_bulk reported 0 added, but list was not empty. All duplicates?")
+            else:
+                logger.debug(f"Task {task_id_str}: Added {added_count} new URLs to Redis notified set.")
+
+    active_chat_ids_notified -= {chat_id for _, chat_id in tasks_to_remove_later}
 
     if tasks_to_remove_later:
         logger.info(f"Removing {len(tasks_to_remove_later)} tasks due to Forbidden errors.")
-        removed_count = 0
-        for task_id_str, chat_id_int in tasks_to_remove_later:
-            if database.remove_task(task_id_str, chat_id_int):
-                removed_count += 1
-            await asyncio.sleep(0.1)
+        removed_count = database.remove_tasks_bulk(tasks_to_remove_later)
         logger.info(f"Successfully removed {removed_count} tasks via Redis due to Forbidden errors.")
 
     logger.info(f"Periodic check finished. Successfully notified {len(active_chat_ids_notified)} unique chats this cycle.")
 
+def _build_announce_chunks(announcement_prefix, tasks):
+    """Formats a chat's tasks into announcement messages of whole task blocks"""
+    # every chunk is the prefix plus whole task blocks, so no MarkdownV2 entity is ever cut
+    max_length = 4000
+    message_chunks = []
+    current_chunk = [announcement_prefix]; current_length = len(announcement_prefix)
+    for task in tasks:
+        task_id = task['id']; platform = task.get('platform', 'N/A'); query = task.get('query', 'N/A')
+        max_price = task.get('max_price', 0.0); sort_options = task.get('sort_options')
+        max_minutes_left = task.get('max_minutes_left')
+        safe_query = _escape_md2(query); safe_platform = _escape_md2(platform.capitalize())
+        safe_sort = _escape_md2(str(sort_options) or 'None') if sort_options else "Default"
+        sort_info = f" \(Sort: `{safe_sort}`\)" if sort_options else ""
+        condition = f"\n   *Condition:* Ending ≤ {max_minutes_left} min" if max_minutes_left is not None else ""
+        task_str = (f"\n• *ID:* `{task_id}`\n"
+                    f"   *Platform:* {safe_platform}\n"
+                    f"   *Query:* `{safe_query}`\n"
+                    f"   *Max Price:* `¥{max_price:,.0f}`{condition}{sort_info}")
+        if current_length + len(task_str) > max_length and len(current_chunk) > 1:
+            message_chunks.append("".join(current_chunk))
+            current_chunk = [announcement_prefix]; current_length = len(announcement_prefix)
+        current_chunk.append(task_str); current_length += len(task_str)
+    message_chunks.append("".join(current_chunk))
+    return message_chunks
+
+async def _announce_to_chat(bot: Bot, chat_id, message_chunks, position, total_users):
+    """Sends one chat its announcement chunks in order. Returns 'sent', 'blocked' or 'failed'"""
+    message_length = sum(len(chunk) for chunk in message_chunks)
+    # chunks not yet delivered, so the plain fallback doesn't resend what already went out
+    unsent_chunks = list(message_chunks)
+    try:
+        if len(message_chunks) > 1:
+            logger.warning(f"Announce for {chat_id} exceeds length ({message_length}). Splitting into {len(message_chunks)} messages.")
+        while unsent_chunks:
+            await _send_rate_limited(bot.send_message, chat_id, text=unsent_chunks[0], parse_mode=ParseMode.MARKDOWN_V2)
+            unsent_chunks.pop(0)
+        return 'sent'
+    except Forbidden: logger.warning(f"Failed announce {chat_id}: Blocked ({position}/{total_users})."); return 'blocked'
+    except BadRequest as e:
+        error_str = str(e).lower()
+        if "can't parse entities" in error_str:
+             logger.error(f"Failed announce {chat_id}: MDv2 parse error - {e}. Len: {message_length}. ({position}/{total_users}). Sending plain.")
+             try:
+                 for chunk in unsent_chunks:
+                     await _send_rate_limited(bot.send_message, chat_id, text=chunk.translate(_MD_STRIP_TABLE))
+                 logger.info(f"Sent plain fallback {chat_id}"); return 'sent'
+             except Exception as pe:
+                 logger.error(f"Plain fallback failed {chat_id}: {pe}")
+                 return 'failed'
+        else: logger.error(f"Failed announce {chat_id}: Unhandled BadRequest - {e}. Len: {message_length} ({position}/{total_users})."); return 'failed'
+    except TimedOut: logger.error(f"Failed announce {chat_id}: Timed out ({position}/{total_users})."); return 'failed'
+    except Exception as e: logger.error(f"Failed announce {chat_id}: {type(e).__name__} - {e} ({position}/{total_users})", exc_info=False); return 'failed'
+
 async def announce_wipe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Sends a DB wipe announcement and task list to all users with tasks using MarkdownV2"""
     if not is_admin(update):
@@ -762,13 +846,16 @@ async def announce_wipe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     logger.info(f"Admin {admin_id} initiated DB wipe announcement.")
     await update.message.reply_text("Fetching users with tasks from Redis...")
 
-    user_chat_ids = database.get_distinct_chat_ids()
+    tasks_by_chat = defaultdict(list)
+    for task in database.get_all_tasks():
+        if task['chat_id']:
+            tasks_by_chat[task['chat_id']].append(task)
+    user_chat_ids = list(tasks_by_chat)
     if not user_chat_ids:
         await update.message.reply_text("No users with active tasks found in Redis.")
         return
 
     total_users = len(user_chat_ids)
-    success_count, fail_count, blocked_count = 0, 0, 0
     logger.info(f"Found {total_users} unique users with tasks in Redis. Starting announcement...")
 
     announcement_prefix = ("🚨 *Bot Maintenance Announcement* 🚨\n\n"
@@ -779,52 +866,16 @@ async def announce_wipe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
                            "*Your current tasks:*\n")
 
     bot = context.bot
-    for i, chat_id in enumerate(user_chat_ids):
-        tasks = database.get_tasks_for_chat(chat_id)
-        if not tasks:
-             logger.debug(f"Skipping announce for chat {chat_id}: No tasks found in Redis.")
-             continue
+    send_sem = asyncio.Semaphore(8)
 
-        message_parts = [announcement_prefix]
-        for task in tasks:
-            task_id = task['id']; platform = task.get('platform', 'N/A'); query = task.get('query', 'N/A')
-            max_price = task.get('max_price', 0.0); sort_options = task.get('sort_options')
-            max_minutes_left = task.get('max_minutes_left')
-            safe_query = escape_markdown(query, version=2); safe_platform = escape_markdown(platform.capitalize(), version=2)
-            safe_sort = escape_markdown(str(sort_options) or 'None', version=2) if sort_options else "Default"
-            sort_info = f" \(Sort: `{safe_sort}`\)" if sort_options else ""
-            condition = f"\n   *Condition:* Ending ≤ {max_minutes_left} min" if max_minutes_left is not None else ""
-            task_str = (f"\n• *ID:* `{task_id}`\n"
-                        f"   *Platform:* {safe_platform}\n"
-                        f"   *Query:* `{safe_query}`\n"
-                        f"   *Max Price:* `¥{max_price:,.0f}`{condition}{sort_info}")
-            message_parts.append(task_str)
-        full_message = "".join(message_parts)
-        try:
-            max_length=4096
-            if len(full_message) > max_length:
-                logger.warning(f"Announce for {chat_id} exceeds length ({len(full_message)}). Splitting.")
-                parts = [full_message[k:k+max_length] for k in range(0, len(full_message), max_length)]
-                for pi, part in enumerate(parts):
-                    if part.strip(): await bot.send_message(chat_id=chat_id, text=part, parse_mode=ParseMode.MARKDOWN_V2); await asyncio.sleep(1.0)
-            else: await bot.send_message(chat_id=chat_id, text=full_message, parse_mode=ParseMode.MARKDOWN_V2)
-            success_count += 1
-        except Forbidden: logger.warning(f"Failed announce {chat_id}: Blocked ({i+1}/{total_users})."); blocked_count += 1
-        except BadRequest as e:
-            error_str = str(e).lower()
-            if "can't parse entities" in error_str:
-                 logger.error(f"Failed announce {chat_id}: MDv2 parse error - {e}. Len: {len(full_message)}. ({i+1}/{total_users}). Sending plain.")
-                 try:
-                     plain_msg = re.sub(r'[*`\\_\[\]\(\)~>
-                     await bot.send_message(chat_id=chat_id, text=plain_msg)
-                     success_count += 1; logger.info(f"Sent plain fallback {chat_id}")
-                 except Exception as pe:
-                     logger.error(f"Plain fallback failed {chat_id}: {pe}")
-                     fail_count += 1
-            else: logger.error(f"Failed announce {chat_id}: Unhandled BadRequest - {e}. Len: {len(full_message)} ({i+1}/{total_users})."); fail_count += 1
-        except TimedOut: logger.error(f"Failed announce {chat_id}: Timed out ({i+1}/{total_users})."); fail_count += 1
-        except Exception as e: logger.error(f"Failed announce {chat_id}: {type(e).__name__} - {e} ({i+1}/{total_users})", exc_info=False); fail_count += 1
-        await asyncio.sleep(1.5)
+    async def announce_one(i, chat_id):
+        async with send_sem:
+            return await _announce_to_chat(bot, chat_id, _build_announce_chunks(announcement_prefix, tasks_by_chat[chat_id]), i + 1, total_users)
+
+    outcomes = await asyncio.gather(*(announce_one(i, chat_id) for i, chat_id in enumerate(user_chat_ids)))
+    success_count = outcomes.count('sent')
+    blocked_count = outcomes.count('blocked')
+    fail_count = outcomes.count('failed')
 
     final_msg = f"Redis wipe announcement finished for {total_users} users.\nSent successfully: {success_count}\nBlocked: {blocked_count}\nOther failures: {fail_count}"
     logger.info(final_msg)
@@ -839,6 +890,7 @@ async def announce_wipe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
 async def post_init(application: Application):
     """Actions to run after the bot has started and initialized"""
     await set_bot_commands(application)
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=config.SCRAPE_CONCURRENCY * 2))
     job_queue = application.job_queue
     if job_queue:
         existing_jobs = job_queue.get_jobs_by_name("periodic_check")
@@ -847,15 +899,27 @@ async def post_init(application: Application):
         logger.info(f"Scheduled monitoring job 'periodic_check' (Redis) every {config.DEFAULT_CHECK_INTERVAL_SECONDS}s.")
     else: logger.error("JobQueue not available. Periodic checks won't run.")
 
+async def post_shutdown(application: Application):
+    """Cleanup after the bot has stopped"""
+    await scraper.close_async_client()
+
 
 def main() -> None:
     """Start the bot"""
     logger.info("Starting bot with Redis backend...")
+    try:
+        import uvloop
+        uvloop.install()
+        logger.info("Using uvloop event loop.")
+    except ImportError:
+        logger.info("uvloop not installed, using default asyncio event loop.")
     application = (
         ApplicationBuilder()
         .token(config.TELEGRAM_BOT_TOKEN)
-        .connect_timeout(30.0).read_timeout(40.0).pool_timeout(30.0)
+        .request(HTTPXRequest(connection_pool_size=64, connect_timeout=30.0, read_timeout=40.0, pool_timeout=20.0, http_version="2"))
+        .get_updates_request(HTTPXRequest(connect_timeout=30.0, read_timeout=40.0, pool_timeout=30.0, http_version="2"))
         .post_init(post_init)
+        .post_shutdown(post_shutdown)
         .build()
     )
 
@@ -14,3 +14,18 @@ REDIS_PREFIX = "zenmonitor:"
 # how many notified item URLs to remember per task (to prevent unbounded memory growth)
 # Set to 0 or None for no limit (use with caution)
 MAX_NOTIFIED_HISTORY_PER_TASK = 0
+
+# how many tasks to fetch per Redis pipeline when loading all tasks
+# (keeps each round trip bounded instead of one giant pipeline)
+CHUNK_SIZE = 500
+
+# max number of scrapes running at the same time during a check cycle
+SCRAPE_CONCURRENCY = 8
+
+# how long parsed tasks stay cached in the bot process (tasks don't change after being added,
+# and this process invalidates them itself on removal); keep above the check interval
+TASK_CACHE_TTL_SECONDS = 10 * 60
+
+# how long a search page's ETag/Last-Modified and parsed items are kept in Redis for conditional GETs
+# (entries for queries nobody monitors anymore just expire)
+PAGE_CACHE_TTL_SECONDS = 24 * 60 * 60
@@ -1,9 +1,13 @@
 import redis
+import hashlib
 import json
 import logging
+import sys
+import time
 from config import (
     REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD,
-    REDIS_PREFIX, MAX_NOTIFIED_HISTORY_PER_TASK
+    REDIS_PREFIX, MAX_NOTIFIED_HISTORY_PER_TASK, CHUNK_SIZE, TASK_CACHE_TTL_SECONDS,
+    PAGE_CACHE_TTL_SECONDS
 )
 logger = logging.getLogger(__name__)
 try:
@@ -42,57 +46,213 @@ def key_next_task_id():
 def key_all_chats():
     return f"{REDIS_PREFIX}all_chats"
 
-def _parse_task_hash(task_hash):
-    """Converts a Redis hash (dict of strings) back into a task dict with correct types"""
-    if not task_hash:
+def key_page_cache(url):
+    return f"{REDIS_PREFIX}page:{hashlib.md5(url.encode()).hexdigest()}"
+
+# tasks are stored as a JSON string of these fields (all string values); tasks written by older
+# versions are hashes with the same fields. Either way they reach _parse_task_fields in this order
+TASK_FIELDS = ('id', 'chat_id', 'platform', 'query', 'max_price', 'sort_options', 'max_minutes_left')
+
+# SMEMBERS of a chat's task set plus each task's value in one round trip (GET, or HMGET of
+# TASK_FIELDS for legacy hashes); ARGV is the key prefix followed by TASK_FIELDS.
+# Replies id, value, id, value, ...
+_CHAT_TASKS_LUA = r.register_script("""
+local ids = redis.call('SMEMBERS', KEYS[1])
+local out = {}
+for _, id in ipairs(ids) do
+    local key = ARGV[1] .. 'task:' .. id
+    out[#out + 1] = id
+    if redis.call('TYPE', key).ok == 'hash' then
+        out[#out + 1] = redis.call('HMGET', key, unpack(ARGV, 2))
+    else
+        out[#out + 1] = redis.call('GET', key)
+    end
+end
+return out
+""")
+
+# removes a task if it belongs to the chat and drops the chat from all_chats once it has no tasks left.
+# KEYS: task, notified, chat_tasks, all_tasks, all_chats; ARGV: task_id, chat_id
+# Replies {task hash deleted (1/0, or -1 if the task isn't the chat's), chat emptied (1/0)}
+_REMOVE_TASK_LUA = r.register_script("""
+if redis.call('SISMEMBER', KEYS[3], ARGV[1]) == 0 then
+    return {-1, 0}
+end
+local deleted = redis.call('DEL', KEYS[1])
+redis.call('DEL', KEYS[2])
+redis.call('SREM', KEYS[3], ARGV[1])
+redis.call('SREM', KEYS[4], ARGV[1])
+if redis.call('SCARD', KEYS[3]) == 0 then
+    redis.call('SREM', KEYS[5], ARGV[2])
+    return {deleted, 1}
+end
+return {deleted, 0}
+""")
+
+# allocates the next task ID, stores the task JSON and adds it to the chat/all sets in one atomic call,
+# so a failed add never leaves partial state. KEYS: next_task_id, chat_tasks, all_tasks, all_chats;
+# ARGV: key prefix, chat_id, then field, value, ... (without 'id').
+# Replies {task_id, SADD chat_tasks, SADD all_tasks, SADD all_chats}
+_ADD_TASK_LUA = r.register_script("""
+local id = redis.call('INCR', KEYS[1])
+local task = {id = tostring(id)}
+for i = 3, #ARGV, 2 do
+    task[ARGV[i]] = ARGV[i + 1]
+end
+redis.call('SET', ARGV[1] .. 'task:' .. id, cjson.encode(task))
+local in_chat = redis.call('SADD', KEYS[2], id)
+local in_all = redis.call('SADD', KEYS[3], id)
+local chat_added = redis.call('SADD', KEYS[4], ARGV[2])
+return {id, in_chat, in_all, chat_added}
+""")
+
+# SADD of new notified URLs plus the history cap in one call, so no other writer can slip in between
+# the size check and the trim. Sets are unordered, so the overflow is evicted with SPOP.
+# The size is only checked when the set actually grew. KEYS: notified; ARGV: cap (0 = unlimited),
+# urls... Replies the number of URLs added
+_ADD_NOTIFIED_LUA = r.register_script("""
+local added = redis.call('SADD', KEYS[1], unpack(ARGV, 2))
+local cap = tonumber(ARGV[1])
+if cap > 0 and added > 0 then
+    local size = redis.call('SCARD', KEYS[1])
+    if size > cap then
+        redis.call('SPOP', KEYS[1], size - cap)
+    end
+end
+return added
+""")
+
+# in-process caches; every caller runs on the bot's event loop thread, so plain dicts are enough.
+# Parsed tasks are immutable and kept for TASK_CACHE_TTL_SECONDS (see config); a chat's task
+# ID set is only kept briefly, add/remove invalidate both
+CHAT_TASKS_CACHE_TTL_SECONDS = 5
+_task_cache = {}  # task_id (str) -> (fetched_at, parsed task dict)
+_chat_tasks_cache = {}  # chat_id (str) -> (fetched_at, set of task IDs)
+
+def _invalidate_task_cache(task_id):
+    _task_cache.pop(str(task_id), None)
+
+def _invalidate_chat_tasks_cache(chat_id):
+    _chat_tasks_cache.pop(str(chat_id), None)
+
+def _cached_task(task_id_str, now):
+    cached = _task_cache.get(task_id_str)
+    if cached and now - cached[0] < TASK_CACHE_TTL_SECONDS:
+        return cached[1]
+    return None
+
+def _decode_task(raw):
+    """Parses a stored task: its JSON string, or the HMGET values of a legacy task hash"""
+    if isinstance(raw, str):
+        try:
+            data = json.loads(raw)
+        except ValueError as e:
+            logger.error(f"Error decoding task JSON: {raw}. Error: {e}")
+            return None
+        raw = [data.get(field) for field in TASK_FIELDS]
+    return _parse_task_fields(raw)
+
+def _parse_task_fields(values):
+    """Converts task values (strings, in TASK_FIELDS order) into a task dict with correct types"""
+    if not values or values[0] is None:
         return None
     try:
-        parsed = task_hash.copy()
-        parsed['id'] = int(parsed.get('id', 0))
-        parsed['chat_id'] = int(parsed.get('chat_id', 0))
-        parsed['max_price'] = float(parsed.get('max_price', 0.0))
-        parsed['sort_options'] = parsed.get('sort_options') if parsed.get('sort_options') else None
-        max_mins_str = parsed.get('max_minutes_left')
-        parsed['max_minutes_left'] = int(max_mins_str) if max_mins_str and max_mins_str.isdigit() else None
-        return parsed
-    except (ValueError, TypeError, KeyError) as e:
-        logger.error(f"Error parsing task hash data: {task_hash}. Error: {e}", exc_info=True)
+        task_id, chat_id, platform, query, max_price, sort_options, max_mins_str = values
+        # interned so tasks sharing a search share one key tuple; the check cycle groups scrapes by it
+        platform = sys.intern(platform) if platform else ''
+        query = sys.intern(query) if query else ''
+        sort_options = sort_options or None
+        return {
+            'id': int(task_id),
+            'chat_id': int(chat_id or 0),
+            'platform': platform,
+            'query': query,
+            'max_price': float(max_price or 0.0),
+            'sort_options': sort_options,
+            'max_minutes_left': int(max_mins_str) if max_mins_str and max_mins_str.isdigit() else None,
+            '_scrape_key': (platform, query, sort_options),
+        }
+    except (ValueError, TypeError) as e:
+        logger.error(f"Error parsing task hash data: {values}. Error: {e}", exc_info=True)
         return None
 
+def _script_unavailable(error):
+    """True if a ResponseError means the server can't run scripts at all (not a runtime error inside one)"""
+    message = str(error).lower()
+    return 'unknown command' in message or 'noscript' in message
+
 def add_task(chat_id, platform, query, max_price, sort_options=None, max_minutes_left=None):
     """Adds a new task to Redis"""
     task_id = -1
+    task_fields = {
+        'chat_id': str(chat_id),
+        'platform': platform,
+        'query': query,
+        'max_price': str(max_price),
+        'sort_options': sort_options or "",
+        'max_minutes_left': str(max_minutes_left) if max_minutes_left is not None else "",
+    }
+    try:
+        try:
+            field_args = [part for pair in task_fields.items() for part in pair]
+            task_id, *sadd_counts = _ADD_TASK_LUA(
+                keys=[key_next_task_id(), key_chat_tasks(chat_id), key_all_tasks(), key_all_chats()],
+                args=[REDIS_PREFIX, chat_id, *field_args])
+        except redis.exceptions.ResponseError as e:
+            # Redis keeps whatever a script wrote before a runtime error, so only fall back when the
+            # script never ran; retrying after a partial run would write a second task
+            if not _script_unavailable(e):
+                _invalidate_chat_tasks_cache(chat_id)
+                logger.error(f"Add task script failed for chat {chat_id}: {e}", exc_info=True)
+                return None
+            logger.warning(f"Scripting unavailable for chat {chat_id}: {e}. Falling back to pipeline.")
+            return _add_task_pipeline(chat_id, task_fields)
+
+        _invalidate_task_cache(task_id)
+        _invalidate_chat_tasks_cache(chat_id)
+        task_data = {'id': str(task_id), **task_fields}
+        parsed_task = _parse_task_fields([task_data[field] for field in TASK_FIELDS])
+        if parsed_task:
+            _task_cache[str(task_id)] = (time.monotonic(), parsed_task)
+        logger.info(f"Successfully added task {task_id} for chat {chat_id} via Redis script. SADD results: {sadd_counts}")
+        return task_id
+    except redis.RedisError as e:
+        logger.error(f"Redis error adding task {task_id if task_id > 0 else '(pre-ID)'} for chat {chat_id}: {e}", exc_info=True)
+        return None
+    except Exception as e:
+        logger.error(f"Unexpected error adding task {task_id if task_id > 0 else '(pre-ID)'} for chat {chat_id}: {e}", exc_info=True)
+        return None
+
+def _add_task_pipeline(chat_id, task_fields):
+    """Non-atomic add_task path (INCR, then one pipeline) for servers that refuse the script"""
+    task_id = -1
     try:
         task_id = r.incr(key_next_task_id())
         logger.info(f"Generated new task ID: {task_id}")
 
-        task_data = {
-            'id': str(task_id),
-            'chat_id': str(chat_id),
-            'platform': platform,
-            'query': query,
-            'max_price': str(max_price),
-            'sort_options': sort_options or "",
-            'max_minutes_left': str(max_minutes_left) if max_minutes_left is not None else "",
-        }
-        num_fields_expected = len(task_data)
-
+        task_data = {'id': str(task_id), **task_fields}
         pipe = r.pipeline()
-        pipe.hset(key_task(task_id), mapping=task_data)
+        pipe.set(key_task(task_id), json.dumps(task_data))
         pipe.sadd(key_chat_tasks(chat_id), task_id)
         pipe.sadd(key_all_tasks(), task_id)
         pipe.sadd(key_all_chats(), chat_id)
         results = pipe.execute()
 
-        if (results[0] == num_fields_expected and
+        _invalidate_task_cache(task_id)
+        _invalidate_chat_tasks_cache(chat_id)
+
+        if (results[0] is True and
             results[1] == 1 and
             results[2] == 1):
+            parsed_task = _parse_task_fields([task_data[field] for field in TASK_FIELDS])
+            if parsed_task:
+                _task_cache[str(task_id)] = (time.monotonic(), parsed_task)
             logger.info(f"Successfully added task {task_id} for chat {chat_id} via Redis pipeline. Results: {results}")
             return task_id
         else:
 
             reason = []
-            if results[0] != num_fields_expected: reason.append(f"HSET fields added {results[0]} != expected {num_fields_expected}")
+            if results[0] is not True: reason.append(f"SET task returned {results[0]}")
             if results[1] != 1: reason.append("SADD chat_tasks failed")
             if results[2] != 1: reason.append("SADD all_tasks failed")
             logger.warning(f"Redis pipeline execution for adding task {task_id} failed critical checks. Reason(s): {'; '.join(reason)}. Full Results: {results}")
@@ -125,27 +285,39 @@ def remove_task(task_id, chat_id):
 
     try:
         task_id_str = str(task_id)
-        if not r.sismember(chat_tasks_key, task_id_str):
+        try:
+            deleted, chat_emptied = _REMOVE_TASK_LUA(
+                keys=[task_key, notified_key, chat_tasks_key, all_tasks_key, all_chats_key],
+                args=[task_id_str, chat_id])
+        except redis.exceptions.ResponseError as e:
+            logger.warning(f"Remove task script failed for task {task_id_str}: {e}. Falling back to pipeline.")
+            if not r.sismember(chat_tasks_key, task_id_str):
+                deleted, chat_emptied = -1, 0
+            else:
+                pipe = r.pipeline()
+                pipe.delete(task_key)
+                pipe.delete(notified_key)
+                pipe.srem(chat_tasks_key, task_id_str)
+                pipe.srem(all_tasks_key, task_id_str)
+                pipe.scard(chat_tasks_key)
+                pre_results = pipe.execute()
+                deleted, chat_emptied = pre_results[0], pre_results[4] == 0
+                if chat_emptied:
+                    r.srem(all_chats_key, chat_id)
+
+        if deleted == -1:
             logger.warning(f"Task removal fail: Task {task_id_str} not found in set for chat {chat_id}.")
             return False
+        _invalidate_task_cache(task_id_str)
+        _invalidate_chat_tasks_cache(chat_id)
+        if chat_emptied:
+            logger.info(f"Chat {chat_id} has no tasks left. Removed from {all_chats_key}.")
 
-        pipe = r.pipeline()
-        pipe.delete(task_key)
-        pipe.delete(notified_key)
-        pipe.srem(chat_tasks_key, task_id_str)
-        pipe.srem(all_tasks_key, task_id_str)
-        pre_results = pipe.execute()
-
-        if r.scard(key_chat_tasks(chat_id)) == 0:
-             logger.info(f"Chat {chat_id} has no tasks left. Removing from {all_chats_key}.")
-             r.srem(key_all_chats(), chat_id)
-
-        if pre_results[0] > 0 :
+        if deleted > 0:
             logger.info(f"Successfully removed task {task_id_str} for chat {chat_id} from Redis.")
-            return True
         else:
-             logger.warning(f"Task removal: Task key {task_key} was already gone after sismember check for task {task_id_str}, chat {chat_id}. SREM results: {pre_results[2:]}")
-             return True
+            logger.warning(f"Task removal: Task key {task_key} was already gone for task {task_id_str}, chat {chat_id}.")
+        return True
 
     except redis.RedisError as e:
         logger.error(f"Redis error removing task {task_id} chat {chat_id}: {e}", exc_info=True)
@@ -154,25 +326,68 @@ def remove_task(task_id, chat_id):
         logger.error(f"Unexpected error removing task {task_id} chat {chat_id}: {e}", exc_info=True)
         return False
 
+def remove_tasks_bulk(pairs):
+    """
+    Removes many (task_id, chat_id) pairs in one pipeline, plus one SREM for chats left empty
+    Returns the number of tasks that were removed
+    """
+    pairs = [(str(task_id), chat_id) for task_id, chat_id in pairs]
+    if not pairs:
+        return 0
+    chat_ids = list(dict.fromkeys(chat_id for _, chat_id in pairs))
+    all_tasks_key = key_all_tasks()
+
+    try:
+        pipe = r.pipeline(transaction=False)
+        for task_id_str, chat_id in pairs:
+            pipe.delete(key_task(task_id_str))
+            pipe.delete(key_notified(task_id_str))
+            pipe.srem(key_chat_tasks(chat_id), task_id_str)
+            pipe.srem(all_tasks_key, task_id_str)
+        for chat_id in chat_ids:
+            pipe.scard(key_chat_tasks(chat_id))
+        results = pipe.execute()
+        for task_id_str, chat_id in pairs:
+            _invalidate_task_cache(task_id_str)
+            _invalidate_chat_tasks_cache(chat_id)
+
+        removed_count = sum(1 for i in range(len(pairs)) if results[4 * i] or results[4 * i + 2])
+        empty_chats = [chat_id for chat_id, size in zip(chat_ids, results[4 * len(pairs):]) if size == 0]
+        if empty_chats:
+            logger.info(f"Chats {empty_chats} have no tasks left. Removing from {key_all_chats()}.")
+            r.srem(key_all_chats(), *empty_chats)
+
+        logger.info(f"Bulk removed {removed_count}/{len(pairs)} tasks from Redis.")
+        return removed_count
+
+    except redis.RedisError as e:
+        logger.error(f"Redis error bulk removing {len(pairs)} tasks: {e}", exc_info=True)
+        return 0
+    except Exception as e:
+        logger.error(f"Unexpected error bulk removing {len(pairs)} tasks: {e}", exc_info=True)
+        return 0
+
 def get_tasks_for_chat(chat_id):
     """Retrieves all tasks (details only) for a specific chat ID from Redis"""
     tasks = []
     chat_tasks_key_val = key_chat_tasks(chat_id)
+    now = time.monotonic()
+    cached_ids = _chat_tasks_cache.get(str(chat_id))
+    if cached_ids and now - cached_ids[0] < CHAT_TASKS_CACHE_TTL_SECONDS:
+        return list(get_tasks_by_ids(cached_ids[1]).values())
     try:
+        try:
+            flat = _CHAT_TASKS_LUA(keys=[chat_tasks_key_val], args=[REDIS_PREFIX, *TASK_FIELDS])
+        except redis.exceptions.ResponseError as e:
+            logger.warning(f"Chat tasks script failed for chat {chat_id}: {e}. Falling back to get_tasks_by_ids.")
+            return list(get_tasks_by_ids(r.smembers(chat_tasks_key_val)).values())
 
-        task_ids = r.smembers(chat_tasks_key_val)
-        if not task_ids:
-            return []
-
-        pipe = r.pipeline()
-        for task_id_str in task_ids:
-            pipe.hgetall(key_task(task_id_str))
-        task_hashes = pipe.execute()
-
-        for task_hash in task_hashes:
-            parsed_task = _parse_task_hash(task_hash)
+        _chat_tasks_cache[str(chat_id)] = (now, set(flat[0::2]))
+        for task_id_str, task_hash in zip(flat[0::2], flat[1::2]):
+            parsed_task = _decode_task(task_hash)
             if parsed_task:
                 tasks.append(parsed_task)
+                _task_cache[task_id_str] = (now, parsed_task)
             else:
 
                 logger.warning(f"Failed to parse task hash during get_tasks_for_chat {chat_id}. Data: {task_hash}")
@@ -196,11 +411,97 @@ def get_all_task_ids():
         logger.error(f"Unexpected error fetching all task IDs: {e}", exc_info=True)
         return set()
 
+def get_tasks_by_ids(task_ids):
+    """
+    Retrieves parsed tasks for the given IDs as a dict keyed by task ID (as string)
+    Tasks fetched within the last TASK_CACHE_TTL_SECONDS are served from memory, the rest
+    are fetched with one MGET per CHUNK_SIZE IDs. Keys MGET can't return (missing, or legacy
+    hashes) go through HMGET pipelines, whose failed entries are retried one by one.
+    IDs whose task is missing or unparsable are left out of the result
+    """
+    tasks = {}
+    misses = []
+    now = time.monotonic()
+    for task_id in task_ids:
+        task_id_str = str(task_id)
+        cached = _cached_task(task_id_str, now)
+        if cached:
+            tasks[task_id_str] = cached
+        else:
+            misses.append(task_id_str)
+    if not misses:
+        return tasks
+
+    def store(task_id_str, task_hash):
+        parsed_task = _decode_task(task_hash)
+        if parsed_task:
+            tasks[task_id_str] = parsed_task
+            _task_cache[task_id_str] = (now, parsed_task)
+        else:
+            logger.warning(f"Failed to parse task hash for task {task_id_str}. Data: {task_hash}")
+
+    legacy_ids = []
+    retry_ids = []
+    try:
+        for start in range(0, len(misses), CHUNK_SIZE):
+            chunk = misses[start:start + CHUNK_SIZE]
+            for task_id_str, blob in zip(chunk, r.mget([key_task(task_id_str) for task_id_str in chunk])):
+                if blob is None:
+                    legacy_ids.append(task_id_str)
+                else:
+                    store(task_id_str, blob)
+
+        for start in range(0, len(legacy_ids), CHUNK_SIZE):
+            chunk = legacy_ids[start:start + CHUNK_SIZE]
+            pipe = r.pipeline(transaction=False)
+            for task_id_str in chunk:
+                pipe.hmget(key_task(task_id_str), TASK_FIELDS)
+            results = pipe.execute(raise_on_error=False)
+            if len(results) != len(chunk):
+                logger.error(f"Mismatch in Redis pipeline results length! Expected {len(chunk)}, got {len(results)}. Retrying unread tasks individually.")
+            for i, task_id_str in enumerate(chunk):
+                result = results[i] if i < len(results) else None
+                if isinstance(result, list):
+                    store(task_id_str, result)
+                else:
+                    retry_ids.append(task_id_str)
+    except redis.RedisError as e:
+        logger.error(f"Redis error fetching task details by IDs: {e}", exc_info=True)
+        return tasks
+    except Exception as e:
+        logger.error(f"Unexpected error fetching task details by IDs: {e}", exc_info=True)
+        return tasks
+
+    if retry_ids:
+        logger.warning(f"Retrying details fetch for {len(retry_ids)} tasks individually.")
+        for task_id_str in retry_ids:
+            try:
+                store(task_id_str, r.hmget(key_task(task_id_str), TASK_FIELDS))
+            except redis.RedisError as e:
+                logger.warning(f"Retry failed for task {task_id_str}: {e}")
+    return tasks
+
+def get_all_tasks():
+    """Retrieves every active task: SMEMBERS of the all-tasks set, then pipelined fetches via get_tasks_by_ids"""
+    return list(get_tasks_by_ids(get_all_task_ids()).values())
+
 def get_task_details(task_id):
     """Retrieves the details hash for a single task (pass ID as string or int)"""
+    task_id_str = str(task_id)
+    now = time.monotonic()
+    cached = _cached_task(task_id_str, now)
+    if cached:
+        return cached
+    task_key = key_task(task_id)
     try:
-        task_hash = r.hgetall(key_task(task_id))
-        return _parse_task_hash(task_hash)
+        try:
+            raw = r.get(task_key)
+        except redis.exceptions.ResponseError:
+            raw = r.hmget(task_key, TASK_FIELDS)
+        parsed_task = _decode_task(raw)
+        if parsed_task:
+            _task_cache[task_id_str] = (now, parsed_task)
+        return parsed_task
     except redis.RedisError as e:
         logger.error(f"Redis error fetching details for task {task_id}: {e}", exc_info=True)
         return None
@@ -209,9 +510,13 @@ def get_task_details(task_id):
         return None
 
 def get_notified_items(task_id):
-    """Retrieves the set of notified item URLs for a task (pass ID as string or int)"""
+    """
+    Retrieves the full set of notified item URLs for a task (pass ID as string or int)
+    Meant for admin/debug use: it walks the set with SSCAN so a large history doesn't block Redis.
+    The check cycle only tests its candidates, see get_already_notified / filter_new_items
+    """
     try:
-        return r.smembers(key_notified(task_id))
+        return set(r.sscan_iter(key_notified(task_id), count=1000))
     except redis.RedisError as e:
         logger.error(f"Redis error fetching notified items for task {task_id}: {e}", exc_info=True)
         return set()
@@ -219,6 +524,53 @@ def get_notified_items(task_id):
         logger.error(f"Unexpected error fetching notified items for task {task_id}: {e}", exc_info=True)
         return set()
 
+def get_already_notified(candidate_urls_by_task):
+    """
+    Checks candidate item URLs against each task's notified set with one pipelined SMISMEMBER
+    per task (chunks of CHUNK_SIZE tasks). Only the candidates are sent, never the whole history
+    Takes {task_id: [url, ...]} and returns {task_id: set of already notified urls}, or None on
+    Redis errors so callers don't mistake a failed read for "nothing notified yet"
+    """
+    already_notified = {}
+    task_items = [(task_id, [str(url) for url in urls]) for task_id, urls in candidate_urls_by_task.items() if urls]
+    try:
+        for start in range(0, len(task_items), CHUNK_SIZE):
+            chunk = task_items[start:start + CHUNK_SIZE]
+            pipe = r.pipeline(transaction=False)
+            for task_id, urls in chunk:
+                pipe.smismember(key_notified(task_id), urls)
+            for (task_id, urls), flags in zip(chunk, pipe.execute()):
+                already_notified[task_id] = {url for url, is_member in zip(urls, flags) if is_member}
+        return already_notified
+    except redis.RedisError as e:
+        logger.error(f"Redis error checking notified items: {e}", exc_info=True)
+        return None
+    except Exception as e:
+        logger.error(f"Unexpected error checking notified items: {e}", exc_info=True)
+        return None
+
+def filter_new_items(task_id, candidate_urls):
+    """
+    Returns the candidate URLs not yet in the task's notified set (one SMISMEMBER of just the
+    candidates). On Redis errors returns None, like get_already_notified
+    """
+    candidate_urls = [str(url) for url in candidate_urls]
+    if not candidate_urls:
+        return []
+    try:
+        flags = r.smismember(key_notified(task_id), candidate_urls)
+        return [url for url, is_member in zip(candidate_urls, flags) if not is_member]
+    except redis.RedisError as e:
+        logger.error(f"Redis error filtering notified items for task {task_id}: {e}", exc_info=True)
+        return None
+    except Exception as e:
+        logger.error(f"Unexpected error filtering notified items for task {task_id}: {e}", exc_info=True)
+        return None
+
+def _history_cap():
+    """MAX_NOTIFIED_HISTORY_PER_TASK as the add script's cap argument (0 disables trimming)"""
+    return MAX_NOTIFIED_HISTORY_PER_TASK if MAX_NOTIFIED_HISTORY_PER_TASK and MAX_NOTIFIED_HISTORY_PER_TASK > 0 else 0
+
 def add_notified_items(task_id, notified_items_list):
     """
     Adds item URLs to the notified set for a task. Handles history limit
@@ -227,24 +579,9 @@ def add_notified_items(task_id, notified_items_list):
     """
     if not notified_items_list:
         return 0
-    notified_key_val = key_notified(task_id)
-    added_count = 0
     try:
         string_items = [str(item) for item in notified_items_list]
-        added_count = r.sadd(notified_key_val, *string_items)
-        if MAX_NOTIFIED_HISTORY_PER_TASK and MAX_NOTIFIED_HISTORY_PER_TASK > 0:
-            current_size = r.scard(notified_key_val)
-            if current_size > MAX_NOTIFIED_HISTORY_PER_TASK:
-                all_items = list(r.smembers(notified_key_val))
-                items_to_keep = all_items[-MAX_NOTIFIED_HISTORY_PER_TASK:]
-                logger.info(f"Task {task_id}: Notified history limit ({MAX_NOTIFIED_HISTORY_PER_TASK}) exceeded ({current_size}). Trimming...")
-                pipe = r.pipeline()
-                pipe.delete(notified_key_val)
-                if items_to_keep:
-                    pipe.sadd(notified_key_val, *items_to_keep)
-                pipe.execute()
-                logger.info(f"Task {task_id}: Notified history trimmed to {len(items_to_keep)} items.")
-        return added_count
+        return _ADD_NOTIFIED_LUA(keys=[key_notified(task_id)], args=[_history_cap(), *string_items])
     except redis.RedisError as e:
         logger.error(f"Redis error adding notified items for task {task_id}: {e}", exc_info=True)
         return 0
@@ -252,6 +589,31 @@ def add_notified_items(task_id, notified_items_list):
         logger.error(f"Unexpected error adding notified items for task {task_id}: {e}", exc_info=True)
         return 0
 
+def add_notified_items_bulk(pending_adds):
+    """
+    Adds notified item URLs for many tasks in one pipeline. Handles history limit
+    Takes [(task_id, [url, ...]), ...] and returns {task_id: number of URLs added}
+    Tasks missing from the result could not be written (Redis error)
+    """
+    pending_adds = [(task_id, [str(item) for item in urls]) for task_id, urls in pending_adds if urls]
+    if not pending_adds:
+        return {}
+    cap = _history_cap()
+    added_counts = {}
+    try:
+        pipe = r.pipeline(transaction=False)
+        for task_id, urls in pending_adds:
+            _ADD_NOTIFIED_LUA(keys=[key_notified(task_id)], args=[cap, *urls], client=pipe)
+        for (task_id, _), added in zip(pending_adds, pipe.execute()):
+            added_counts[task_id] = added
+        return added_counts
+    except redis.RedisError as e:
+        logger.error(f"Redis error adding notified items in bulk: {e}", exc_info=True)
+        return added_counts
+    except Exception as e:
+        logger.error(f"Unexpected error adding notified items in bulk: {e}", exc_info=True)
+        return added_counts
+
 def get_distinct_chat_ids():
     """Retrieves a list of unique chat IDs (as integers) that have tasks"""
     try:
@@ -263,3 +625,34 @@ def get_distinct_chat_ids():
     except Exception as e:
         logger.error(f"Unexpected error fetching distinct chat IDs: {e}", exc_info=True)
         return []
+
+def get_page_cache(url):
+    """
+    Retrieves the cached validators and parsed items for a search page URL
+    Returns {'etag': ..., 'last_modified': ..., 'fetched_at': ..., 'items': [[...], ...]} or None if nothing is cached
+    """
+    try:
+        raw = r.get(key_page_cache(url))
+        return json.loads(raw) if raw else None
+    except redis.RedisError as e:
+        logger.error(f"Redis error fetching page cache for {url}: {e}", exc_info=True)
+        return None
+    except Exception as e:
+        logger.error(f"Unexpected error fetching page cache for {url}: {e}", exc_info=True)
+        return None
+
+def set_page_cache(url, etag, last_modified, fetched_at, items):
+    """
+    Stores a search page's ETag/Last-Modified with its parsed items and the Unix time they were fetched
+    (expires after PAGE_CACHE_TTL_SECONDS)
+    """
+    payload = json.dumps({'etag': etag, 'last_modified': last_modified, 'fetched_at': fetched_at, 'items': items})
+    try:
+        r.set(key_page_cache(url), payload, ex=PAGE_CACHE_TTL_SECONDS)
+        return True
+    except redis.RedisError as e:
+        logger.error(f"Redis error storing page cache for {url}: {e}", exc_info=True)
+        return False
+    except Exception as e:
+        logger.error(f"Unexpected error storing page cache for {url}: {e}", exc_info=True)
+        return False
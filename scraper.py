@@ -1,21 +1,112 @@
+import asyncio
+import httpx
+import importlib.util
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
 import logging
 import re
+import time
+from functools import lru_cache
+from typing import NamedTuple, Optional
 from urllib.parse import quote_plus, urljoin
-from config import USER_AGENT
+from config import USER_AGENT, SCRAPE_CONCURRENCY
+import redis_db as database
 
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logging.getLogger("requests").setLevel(logging.WARNING)
 logging.getLogger("urllib3").setLevel(logging.WARNING)
+logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
+# lxml's C parser is much faster than the pure-Python html.parser; use it when it's installed
+_HTML_PARSER = 'lxml' if importlib.util.find_spec('lxml') else 'html.parser'
+
+# keep-alive session for the sync scrape path, with a couple of retries on connection errors
+_session = requests.Session()
+_session.headers.update({'User-Agent': USER_AGENT, 'Accept-Encoding': 'gzip, deflate'})
+_session.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=16,
+                                       max_retries=Retry(total=2, backoff_factor=0.3)))
+
+# Telegram rejects photo uploads over 10 MB
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+
+_async_client = httpx.AsyncClient(
+    http2=True,
+    follow_redirects=True,
+    headers={'User-Agent': USER_AGENT},
+    timeout=30,
+    limits=httpx.Limits(max_connections=SCRAPE_CONCURRENCY * 2)
+)
+
+# CSS selectors per platform; yahoo auctions have a combined name/link element and a time left
+PLATFORM_CFG = {
+    'yahoo': {
+        'item': "div.yahoo-search-result",
+        'name': "",
+        'link': "",
+        'name_link': "div.translate a.auction-url",
+        'price': "div.auction-price span.amount",
+        'img': "div.img-wrap img",
+        'img_attribute': "src",
+        'time': "div.col-md-7 div:has(> span.glyphicon-time)",
+    },
+    'mercari': {
+        'item': "div.product",
+        'name': "h3.item-title",
+        'link': "a.product-link",
+        'name_link': "",
+        'price': "div.price span.amount",
+        'img': "div.img-wrap img",
+        'img_attribute': "src",
+        'time': "",
+    },
+    'rakuten': {
+        'item': "div.product",
+        'name': "h3.item-title",
+        'link': "a.product-link",
+        'name_link': "",
+        'price': "div.price span.amount",
+        'img': "div.img-wrap img",
+        'img_attribute': "src",
+        'time': "",
+    },
+}
+
+class _PriceKeepTable(dict):
+    """str.translate table that keeps decimal digits and '.' (what r'[^\d.]' kept) and drops the rest, filled lazily"""
+    def __missing__(self, code):
+        char = chr(code)
+        kept = code if char == '.' or char.isdecimal() else None
+        self[code] = kept
+        return kept
+
+_PRICE_KEEP = _PriceKeepTable()
+_DAYS_RE = re.compile(r'(\d+)\s+day')
+_HOURS_RE = re.compile(r'(\d+)\s+hour')
+_MINS_RE = re.compile(r'(\d+)\s+(?:minute|min)')
+# lowercase markers of the 'no results' page, checked against the raw body
+_NO_RESULTS_MARKERS = ('find any items matching', 'no results found')
+
+class ItemResult(NamedTuple):
+    """One scraped search result"""
+    name: str
+    price: float
+    url: str
+    image_url: Optional[str]
+    minutes_left: Optional[int] = None
+
 def clean_price(price_str):
     """Removes non-numeric characters (except '.') and converts to float"""
     if not price_str:
         return None
+    price_str = str(price_str)
+    # data-jpy attributes are usually plain digits already
+    if price_str.isdecimal():
+        return float(price_str)
 
-    cleaned = re.sub(r'[^\d.]', '', str(price_str))
+    cleaned = price_str.translate(_PRICE_KEEP)
     try:
         if cleaned.count('.') > 1:
             parts = cleaned.split('.')
@@ -50,10 +141,10 @@ def parse_time_remaining(time_str):
     try:
 
 
-        days_matches = re.findall(r'(\d+)\s+day', time_str_lower)
-        hours_matches = re.findall(r'(\d+)\s+hour', time_str_lower)
+        days_matches = _DAYS_RE.findall(time_str_lower)
+        hours_matches = _HOURS_RE.findall(time_str_lower)
 
-        minutes_matches = re.findall(r'(\d+)\s+(?:minute|min)', time_str_lower)
+        minutes_matches = _MINS_RE.findall(time_str_lower)
 
         if days_matches:
             total_minutes += sum(int(d) * 24 * 60 for d in days_matches)
@@ -74,8 +165,9 @@ def parse_time_remaining(time_str):
         logger.error(f"Unexpected error parsing time string '{time_str}': {e}", exc_info=True)
         return None
 
+@lru_cache(maxsize=512)
 def build_url(platform, query, sort_options=None):
-    """Builds the correct ZenMarket URL"""
+    """Builds the correct ZenMarket URL (memoized, tasks re-poll the same searches every cycle)"""
     try:
         encoded_query = quote_plus(query)
     except TypeError:
@@ -108,23 +200,62 @@ def build_url(platform, query, sort_options=None):
 
     return url
 
+def _conditional_headers(cached_page):
+    """Builds If-None-Match / If-Modified-Since headers from a cached page entry"""
+    headers = {}
+    if cached_page:
+        if cached_page.get('etag'):
+            headers['If-None-Match'] = cached_page['etag']
+        if cached_page.get('last_modified'):
+            headers['If-Modified-Since'] = cached_page['last_modified']
+    return headers
+
+def _cached_results(cached_page):
+    """
+    Rebuilds the ItemResult list stored with a cached page. Countdowns are aged by the minutes since
+    the page was fetched, and auctions whose countdown has run out are dropped
+    """
+    elapsed_minutes = int((time.time() - cached_page.get('fetched_at', 0)) // 60)
+    results = []
+    for row in cached_page.get('items', []):
+        item = ItemResult(*row)
+        if item.minutes_left is not None and item.minutes_left != -1 and elapsed_minutes > 0:
+            minutes_left = item.minutes_left - elapsed_minutes
+            if minutes_left < 0:
+                continue
+            item = item._replace(minutes_left=minutes_left)
+        results.append(item)
+    return results
+
+def _remember_page(search_page_url, response_headers, results):
+    """Caches the page's validators and parsed items, if the server sent validators and parsing succeeded"""
+    if results is None:
+        return
+    etag = response_headers.get('ETag')
+    last_modified = response_headers.get('Last-Modified')
+    if etag or last_modified:
+        database.set_page_cache(search_page_url, etag, last_modified, time.time(), [list(item) for item in results])
+
 def scrape_zenmarket(platform, query, sort_options=None):
     """
     Scrapes ZenMarket search results
-    Returns a list of dictionaries: [{'name', 'price', 'url', 'image_url', 'minutes_left' (optional)}]
+    Returns a list of ItemResult (minutes_left is None if unknown)
     Returns an empty list ([]) if no results found or on expected errors like HTTP 404/timeouts
     Returns None only on critical unexpected errors during setup/request/parsing
+    Sends the cached ETag/Last-Modified, and a 304 reuses the items parsed last time
     """
     search_page_url = build_url(platform, query, sort_options)
     if not search_page_url:
         logger.error(f"Failed to build URL for platform={platform}, query={query}")
         return None
-    base_url = "https://zenmarket.jp/"
     logger.info(f"Scraping URL: {search_page_url}")
-    headers = {'User-Agent': USER_AGENT}
 
+    cached_page = database.get_page_cache(search_page_url)
     try:
-        response = requests.get(search_page_url, headers=headers, timeout=30)
+        response = _session.get(search_page_url, headers=_conditional_headers(cached_page), timeout=30)
+        if response.status_code == 304 and cached_page:
+            logger.info(f"Not modified (304): {search_page_url}, reusing cached results.")
+            return _cached_results(cached_page)
         response.raise_for_status()
     except requests.exceptions.Timeout:
         logger.error(f"Timeout fetching URL {search_page_url}")
@@ -139,55 +270,125 @@ def scrape_zenmarket(platform, query, sort_options=None):
     except requests.exceptions.RequestException as e:
         logger.error(f"Failed to fetch URL {search_page_url} due to RequestException: {e}")
         return []
+    results = parse_search_results(platform, query, search_page_url, response.content)
+    _remember_page(search_page_url, response.headers, results)
+    return results
+
+async def scrape_zenmarket_async(platform, query, sort_options=None):
+    """
+    Async version of scrape_zenmarket using a shared httpx.AsyncClient
+    Same return contract as scrape_zenmarket. HTML parsing runs in a worker thread
+    so it doesn't block the event loop
+    """
+    search_page_url = build_url(platform, query, sort_options)
+    if not search_page_url:
+        logger.error(f"Failed to build URL for platform={platform}, query={query}")
+        return None
+    logger.info(f"Scraping URL: {search_page_url}")
+
+    cached_page = database.get_page_cache(search_page_url)
+    try:
+        response = await _async_client.get(search_page_url, headers=_conditional_headers(cached_page))
+        if response.status_code == 304 and cached_page:
+            logger.info(f"Not modified (304): {search_page_url}, reusing cached results.")
+            return _cached_results(cached_page)
+        response.raise_for_status()
+    except httpx.TimeoutException:
+        logger.error(f"Timeout fetching URL {search_page_url}")
+        return []
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 404:
+            logger.warning(f"URL not found (404): {search_page_url}. Likely invalid query/params or page removed.")
+            return []
+        else:
+            logger.error(f"HTTP error fetching URL {search_page_url}: {e}")
+            return []
+    except httpx.RequestError as e:
+        logger.error(f"Failed to fetch URL {search_page_url} due to RequestError: {e}")
+        return []
+    results = await asyncio.to_thread(parse_search_results, platform, query, search_page_url, response.content)
+    _remember_page(search_page_url, response.headers, results)
+    return results
+
+async def scrape_many(scrape_keys):
+    """
+    Runs scrape_zenmarket_async for each (platform, query, sort_options), SCRAPE_CONCURRENCY at a time
+    Returns the results in the same order; a scrape that raised is returned as its exception
+    """
+    sem = asyncio.Semaphore(SCRAPE_CONCURRENCY)
+
+    async def gated(platform, query, sort_options):
+        async with sem:
+            return await scrape_zenmarket_async(platform, query, sort_options)
+
+    return await asyncio.gather(*(gated(*key) for key in scrape_keys), return_exceptions=True)
+
+async def fetch_image(image_url):
+    """
+    Downloads an item image with the shared client
+    Returns the bytes, or None if it can't be fetched, isn't an image or is over MAX_IMAGE_BYTES
+    """
+    try:
+        async with _async_client.stream('GET', image_url, timeout=10) as response:
+            response.raise_for_status()
+            content_type = response.headers.get('Content-Type', '')
+            if not content_type.startswith('image/'):
+                logger.warning(f"Not an image ({content_type or 'no Content-Type'}): {image_url}")
+                return None
+            declared_size = response.headers.get('Content-Length', '')
+            if declared_size.isdigit() and int(declared_size) > MAX_IMAGE_BYTES:
+                logger.warning(f"Image too large ({declared_size} bytes): {image_url}")
+                return None
+            chunks = []
+            size = 0
+            async for chunk in response.aiter_bytes():
+                size += len(chunk)
+                if size > MAX_IMAGE_BYTES:
+                    logger.warning(f"Image too large (over {MAX_IMAGE_BYTES} bytes): {image_url}")
+                    return None
+                chunks.append(chunk)
+            return b''.join(chunks) or None
+    except httpx.HTTPError as e:
+        logger.warning(f"Failed to download image {image_url}: {e}")
+        return None
+
+async def close_async_client():
+    """Closes the shared httpx.AsyncClient (call on bot shutdown)"""
+    await _async_client.aclose()
+
+def parse_search_results(platform, query, search_page_url, content):
+    """
+    Parses a ZenMarket search results page (raw HTML bytes) into ItemResult tuples
+    Returns [] if no results were found, None on critical parsing errors
+    """
+    base_url = "https://zenmarket.jp/"
     try:
-        soup = BeautifulSoup(response.content, 'html.parser')
+        soup = BeautifulSoup(content, _HTML_PARSER)
     except Exception as e:
         logger.error(f"Failed to parse HTML content from {search_page_url}: {e}", exc_info=True)
         return None
 
     results = []
 
-    item_selector = ""
-    name_selector = ""
-    link_selector = ""
-    name_link_selector = ""
-    price_selector = ""
-    img_selector = ""
-    img_attribute = "src"
-    time_selector = ""
-
-    if platform == 'yahoo':
-        item_selector = "div.yahoo-search-result"
-        name_link_selector = "div.translate a.auction-url"
-        price_selector = "div.auction-price span.amount"
-        img_selector = "div.img-wrap img"
-        time_selector = "div.col-md-7 div:has(> span.glyphicon-time)"
-
-    elif platform == 'mercari':
-        item_selector = "div.product"
-        name_selector = "h3.item-title"
-        link_selector = "a.product-link"
-        price_selector = "div.price span.amount"
-        img_selector = "div.img-wrap img"
-        img_attribute = "src"
-
-    elif platform == 'rakuten':
-        item_selector = "div.product"
-        name_selector = "h3.item-title"
-        link_selector = "a.product-link"
-        price_selector = "div.price span.amount"
-        img_selector = "div.img-wrap img"
-        img_attribute = "src"
-
-    else:
+    cfg = PLATFORM_CFG.get(platform)
+    if cfg is None:
         logger.error(f"Scraping logic not defined for platform: {platform}")
         return None
+    item_selector = cfg['item']
+    name_selector = cfg['name']
+    link_selector = cfg['link']
+    name_link_selector = cfg['name_link']
+    price_selector = cfg['price']
+    img_selector = cfg['img']
+    img_attribute = cfg['img_attribute']
+    time_selector = cfg['time']
 
     items = soup.select(item_selector)
     if not items:
         logger.warning(f"No items found with selector '{item_selector}' on {search_page_url}. Checking for 'no results' message.")
-        no_results_indicator = soup.find(text=re.compile("find any items matching|No results found", re.IGNORECASE))
-        no_results_element = soup.select_one(".products-not-found-text, .search-results-empty,
+        body_lc = (content.decode('utf-8', 'ignore') if isinstance(content, bytes) else content).lower()
+        no_results_indicator = any(marker in body_lc for marker in _NO_RESULTS_MARKERS)
+        no_results_element = soup.select_one(".products-not-found-text, .search-results-empty")
         if no_results_indicator or no_results_element:
             logger.info(f"Search returned no results for query '{query}' on {platform}.")
             return []
@@ -270,15 +471,7 @@ def scrape_zenmarket(platform, query, sort_options=None):
                         image_url = urljoin(base_url, raw_image_url)
                 else: logger.debug(f"{platform.capitalize()} item {item_index}: Image element not found with '{img_selector}'")
             if name and name != "N/A" and price is not None and item_url:
-                item_data = {
-                    'name': name,
-                    'price': price,
-                    'url': item_url,
-                    'image_url': image_url
-                }
-                if minutes_left is not None:
-                    item_data['minutes_left'] = minutes_left
-                results.append(item_data)
+                results.append(ItemResult(name, price, item_url, image_url, minutes_left))
             elif item_url:
                  logger.debug(f"Skipping item {item_index} due to missing essential data: Name='{name}', Price={price}, URL='{item_url}'")
         except Exception as e: